@@ -1,4 +1,4 @@
-import Encoders, Motors, PID, DataLog
+import Encoders, Motors, PID, DataLog, LoopScheduler, Pipeline, LatencyAnalytics, StageProfiler
 
 import numpy, time
 from math import pi, sin
@@ -19,6 +19,12 @@ max_throttle_pulse_width = 1940 #in microseconds
 deadband = 20 #pulse width in microseconds
 throttle_deadband = 100*20/(1940-1100)/2.0
 PWM_frequency = 500 #in Hz
+asynchronous_motor_writes = True #write PWM commands from a separate thread
+loop_rate = 500 #control loop rate in Hz
+latency_budgets = {'iteration_latency': 1.0/loop_rate} #seconds; checked at p99.9 when the test is stopped
+profile_stages = True #time each stage of the loop iteration (see StageProfiler.py)
+stream_log = True #stream every logged sample to a binary file (see DataLog.ColumnarDataLog.startStream)
+use_pipeline = False #run sensing, control and actuation in separate processes (see Pipeline.py)
 kV = 300 #RPM per volt
 supplyVoltage = 12
 velocityUnits = 'Hz'
@@ -52,7 +58,7 @@ def wave(amp, phi, f, t):
 
 def main():
     try:
-        dataLog = DataLog.DataLog(logDir = 'logs/')
+        dataLog = DataLog.ColumnarDataLog(logDir = 'logs/')
         dataLog.updateLog({'velocity_units':velocityUnits})
 
         encoders = Encoders.Encoders(countsPerRevolution = countsPerRevolution, units = velocityUnits)
@@ -65,42 +71,121 @@ def main():
         motors.motor_startup()
         for i in xrange(3):
             motors.setPWM(i, 0)
+        if asynchronous_motor_writes:
+            motors.startWriter()
         
         freq = 1/2.0
 
         dataLog.updateLog({'start_time': time.time()})
+        if stream_log:
+            dataLog.startStream(dataLog.logDir + 'Closed_Loop_Test_{0}.bin'.format(datetime.now()))
+
+        scheduler = LoopScheduler.LoopScheduler(loop_rate)
+        latencies = LatencyAnalytics.LatencyBudget(['iteration_latency', 'command_latency', 'measurement_to_command_latency'], latency_budgets)
+
+        profiler = StageProfiler.StageProfiler(enabled = profile_stages)
+        motors.setProfiler(profiler) #pwm_computation and i2c_write (measured in the writer thread in asynchronous mode)
+        ENCODER_READ = profiler.stage('encoder_read')
+        VELOCITY_ESTIMATION = profiler.stage('velocity_estimation')
+        CONTROL_LAW = profiler.stage('control_law')
+        LOGGING = profiler.stage('logging')
 
         while True:
             #get measured velocity array
             #calculate commanded velocities array
             #convert commanded velocities to throttle
             #send commanded PWM signal to motors
-            loop_start_time = time.time()
+            loop_start_time = scheduler.wait()
+            profiler.start()
             count_array = encoders.returnCountArray()
+            profiler.mark(ENCODER_READ)
             measured_velocities = encoders.getVelocities()
             print measured_velocities
+            profiler.mark(VELOCITY_ESTIMATION)
             command_time = time.time()
             commanded_throttles = [wave(100,2*pi/nmotors*pwmNum, freq, command_time) for pwmNum in xrange(nmotors)]
-            for pwmNum, throttle in enumerate(commanded_throttles):
-                motors.setPWM(pwmNum,throttle)
+            profiler.mark(CONTROL_LAW)
+            motors.setPWMs(commanded_throttles)
             loop_end_time = time.time()
 
             #write information to logs
+            dataLog.record(loop_start_time,
+                count_array[0], count_array[1:],
+                command_time, map(actuatorVelocityModel, commanded_throttles), commanded_throttles,
+                measured_velocities[0], measured_velocities[1:],
+                loop_end_time - loop_start_time, loop_end_time - command_time, command_time - measured_velocities[0])
+            latencies.record('iteration_latency', loop_end_time - loop_start_time)
+            latencies.record('command_latency', loop_end_time - command_time)
+            latencies.record('measurement_to_command_latency', command_time - measured_velocities[0])
+            profiler.mark(LOGGING)
+            profiler.end()
+
+    except KeyboardInterrupt:
+        motors.setPWMs([0]*nmotors)
+        motors.close() #writes pending commands before returning
+        print 'Motor writer stats: {0}'.format(motors.getWriterStats())
+        scheduler.printStats()
+        print latencies.report()
+        print 'Latency budgets (p99.9): {0}'.format(latencies.checkBudgets())
+        dataLog.stopStream()
+        if profile_stages:
+            print profiler.report()
+            dataLog.updateLog({'stage_latency': profiler.getLog(asLists = True)})
+        dataLog.saveLog(baseName = 'Closed_Loop_Test')   
+
+def makeEncoders():
+    return Encoders.Encoders(countsPerRevolution = countsPerRevolution, units = velocityUnits)
+
+def makeMotors():
+    motors = Motors.Motors(i2c_bus_num,nmotors,min_throttle_percentage, max_throttle_percentage, min_throttle_pulse_width, max_throttle_pulse_width)
+    motors.setPWMfreq(PWM_frequency)
+    return motors
+
+def waveController(sample):
+    freq = 1/2.0
+    command_time = time.time()
+    return [wave(100,2*pi/nmotors*pwmNum, freq, command_time) for pwmNum in xrange(nmotors)]
+
+def pipelineMain():
+    #ESC startup needs user input, so run it here before the stage processes start
+    motors = makeMotors()
+    motors.motor_startup()
+    motors.setPWMs([0]*nmotors)
+    motors.close()
+
+    dataLog = DataLog.DataLog(logDir = 'logs/')
+    dataLog.updateLog({'velocity_units':velocityUnits})
+    dataLog.updateLog({'start_time': time.time()})
+
+    pipeline = Pipeline.Pipeline(makeEncoders, makeMotors, waveController, nmotors = nmotors, controlRate = loop_rate, actuationRate = loop_rate)
+    pipeline.start()
+
+    #log newest sample and command from the parent process
+    scheduler = LoopScheduler.LoopScheduler(loop_rate)
+    last_command_time = None
+    try:
+        while True:
+            scheduler.wait()
+            command = pipeline.latestCommand()
+            if command[1] == last_command_time:
+                continue
+            last_command_time = command[1]
+            sample = pipeline.latestSample()
+            commanded_throttles = command[2:].tolist()
             log_info = {
-                'counts': dict(zip(['time', 0, 1, 2], count_array)),
-                'commanded_velocity': dict(zip(['time', 0, 1, 2],[command_time] + map(actuatorVelocityModel, commanded_throttles))),
-                'commanded_throttle': dict(zip(['time', 0, 1, 2],[command_time] + commanded_throttles)),
-                'measured_velocity': dict(zip(['time', 0, 1, 2], measured_velocities)),
-                'iteration_latency': loop_end_time - loop_start_time,
-                'command_latency': loop_end_time - command_time,
-                'measurement_to_command_latency': command_time - measured_velocities[0]
+                'counts': dict(zip(['time', 0, 1, 2], [sample[0]] + sample[1 + nmotors:].tolist())),
+                'commanded_velocity': dict(zip(['time', 0, 1, 2],[command[1]] + map(actuatorVelocityModel, commanded_throttles))),
+                'commanded_throttle': dict(zip(['time', 0, 1, 2],[command[1]] + commanded_throttles)),
+                'measured_velocity': dict(zip(['time', 0, 1, 2], sample[:1 + nmotors].tolist())),
+                'measurement_to_command_latency': command[1] - command[0]
                 }
             dataLog.updateLog(log_info)
-
     except KeyboardInterrupt:
-        for i in xrange(3):
-            motors.setPWM(i, 0)
-        dataLog.saveLog(baseName = 'Closed_Loop_Test')   
+        pipeline.stop()
+        dataLog.saveLog(baseName = 'Closed_Loop_Test')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if use_pipeline:
+        pipelineMain()
+    else:
+        main()
\ No newline at end of file
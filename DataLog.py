@@ -1,14 +1,40 @@
 from collections import deque
 import os
+import json
+import struct
+import threading
+import Queue
+import numpy
 
 class DataLog:
     """
     Class to contain saved data and save to json file when commanded.
 
     All logged data are limited to self.__buffer_length unique records.
-    Exclusively uses jsonpickle library to read/write log data.
+    Uses jsonpickle library to read/write json log data.
+
+    Logs can also be saved in a columnar binary format (saveColumnarLog) that openLog memory-maps instead of parsing:
+        COLUMNAR_MAGIC, header length (uint32, little-endian), json header, then one contiguous array per signal.
+        The header holds 'metadata' (velocity_units, start_time, ...) and 'signals', a list of {'name', 'dtype', 'length', 'units', 'offset'}.
+        Signal names are 'group/key' for grouped signals (e.g. 'counts/time', 'counts/0') and the log key otherwise.
+        The data section starts at the first multiple of COLUMNAR_ALIGNMENT bytes after the header. Signal offsets are relative to it and also aligned.
     """
 
+    COLUMNAR_MAGIC = 'CUBLCOLS'
+    COLUMNAR_ALIGNMENT = 64
+
+    #units for each log entry; 'velocity' is replaced with the log's velocity_units
+    signal_units = {
+        'counts': 'counts',
+        'commanded_velocity': 'velocity',
+        'commanded_throttle': '%',
+        'measured_velocity': 'velocity',
+        'command_latency': 's',
+        'measurement_to_command_latency': 's',
+        'iteration_latency': 's',
+        'stage_latency': 's'
+        }
+
     def __init__(self,logDir = None, buffer_length = 5*10**4,logging = True):
         self.__buffer_length = buffer_length
         self.log = {
@@ -30,7 +56,8 @@ class DataLog:
             'measurement_to_command_latency': deque(maxlen = self.__buffer_length),
             'iteration_latency': deque(maxlen = self.__buffer_length),
             'velocity_units': None,
-            'PID_parameters': None
+            'PID_parameters': None,
+            'stage_latency': None #per-stage durations from StageProfiler.getLog
         }
 
         #set path for saving log file if it exists
@@ -100,15 +127,285 @@ class DataLog:
                 #raise TypeError("Function 'updateLog' received input in 'kwDict' that was neither dictType or an instance of deque.")
 
     def openLog(self, filePath):
+        """Open a json or columnar log. Columnar logs are memory-mapped and signals are returned as NumPy views."""
+        filePath = str(filePath)
+
+        with open(filePath, 'rb') as f:
+            magic = f.read(len(self.COLUMNAR_MAGIC))
+        if magic == self.COLUMNAR_MAGIC:
+            return self.__openColumnarLog(filePath)
+
         import jsonpickle
         jsonpickle.set_encoder_options('simplejson', sort_keys=True, indent=4)
         jsonpickle.set_preferred_backend('simplejson')
 
-        filePath = str(filePath)
-
         try:
             with open(filePath, 'r') as f:
                 obj = jsonpickle.decode(f.read(), keys = True)
             return obj
         except:
             raise RuntimeError('Unable to open and decode json file at {0}'.format(filePath))
+
+    def saveColumnarLog(self, filePath, log = None):
+        """Save log (self.log by default, or a dict returned by openLog) in columnar binary format."""
+        if log is None:
+            log = self.log
+
+        velocity_units = log.get('velocity_units')
+        metadata = {}
+        columns = []
+        for key in sorted(log, key = str):
+            value = log[key]
+            if key not in self.signal_units:
+                metadata[key] = value
+                continue
+            if value is None:
+                #optional signal that was not logged
+                continue
+            units = self.signal_units[key]
+            if units == 'velocity':
+                units = velocity_units
+            if isinstance(value, dict):
+                for subkey in sorted(value, key = str):
+                    columns.append(('{0}/{1}'.format(key, subkey), 's' if subkey == 'time' else units, value[subkey]))
+            else:
+                columns.append((key, units, value))
+
+        signals = []
+        arrays = []
+        offset = 0
+        for name, units, values in columns:
+            array = numpy.ascontiguousarray(numpy.asarray(list(values) if isinstance(values, deque) else values, dtype = numpy.float64 if name.endswith('/time') else None))
+            if array.dtype == numpy.object_ or array.ndim != 1:
+                raise RuntimeError("Log signal '{0}' is not a 1-D numeric series.".format(name))
+            signals.append({'name': name, 'dtype': array.dtype.str, 'length': len(array), 'units': units, 'offset': offset})
+            arrays.append(array)
+            offset += -(-array.nbytes//self.COLUMNAR_ALIGNMENT)*self.COLUMNAR_ALIGNMENT
+
+        header = json.dumps({'metadata': metadata, 'signals': signals}, default = str)
+        data_start = self.__columnarDataStart(len(header))
+
+        with open(str(filePath), 'wb') as f:
+            f.write(self.COLUMNAR_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            for signal, array in zip(signals, arrays):
+                f.seek(data_start + signal['offset'])
+                f.write(array.tostring())
+            f.truncate(data_start + offset)
+
+    def convertLog(self, jsonPath, columnarPath = None):
+        """Convert a json log to columnar format. Output defaults to the same path with a .cols extension."""
+        if columnarPath is None:
+            columnarPath = os.path.splitext(str(jsonPath))[0] + '.cols'
+        self.saveColumnarLog(columnarPath, self.openLog(jsonPath))
+        return columnarPath
+
+    def __columnarDataStart(self, header_length):
+        #data section starts at the first aligned position after the header
+        header_end = len(self.COLUMNAR_MAGIC) + 4 + header_length
+        return -(-header_end//self.COLUMNAR_ALIGNMENT)*self.COLUMNAR_ALIGNMENT
+
+    def __openColumnarLog(self, filePath):
+        with open(filePath, 'rb') as f:
+            f.seek(len(self.COLUMNAR_MAGIC))
+            header_length = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(header_length))
+        data_start = self.__columnarDataStart(header_length)
+
+        raw = numpy.memmap(filePath, dtype = numpy.uint8, mode = 'r')
+        log = dict((str(key), value) for key, value in header['metadata'].items())
+        log['units'] = {}
+        for signal in header['signals']:
+            dtype = numpy.dtype(str(signal['dtype']))
+            start = data_start + signal['offset']
+            view = raw[start:start + signal['length']*dtype.itemsize].view(dtype)
+            name = str(signal['name'])
+            log['units'][name] = signal['units']
+            if '/' in name:
+                group, key = name.split('/', 1)
+                if key.isdigit():
+                    key = int(key)
+                log.setdefault(group, {})[key] = view
+            else:
+                log[name] = view
+        return log
+
+
+class ColumnarDataLog(DataLog):
+    """
+    DataLog backend that stores control loop samples in one preallocated NumPy structured array.
+
+    Each call to record() writes one row by index, so the control loop allocates no dicts or lists and memory use is fixed at buffer_length rows. Once full, the oldest rows are overwritten.
+    Metadata ('velocity_units', 'start_time', 'PID_parameters') is still set with updateLog. saveLog writes the same json format as DataLog, so openLog and graphical_analysis.py work unchanged.
+
+    Streaming:
+        startStream(filePath) additionally appends every row to a binary file, so runs longer than buffer_length are kept. Each time chunk_length rows have been recorded, they are copied into a preallocated chunk and put on a bounded queue. A background thread writes each chunk to disk and fsyncs it. The control loop only pays the copy and enqueue, and a crash loses at most the chunk in progress. If the writer falls behind by queue_length chunks, record blocks rather than dropping data.
+
+        Stream file layout: STREAM_MAGIC, header length (uint32, little-endian), json header {'dtype', 'metadata'}, then fixed-size rows. Read it back with openStreamLog.
+    """
+
+    nchannels = 3
+
+    STREAM_MAGIC = 'CUBLSTRM'
+    metadata_keys = ['velocity_units', 'start_time', 'PID_parameters']
+
+    dtype = numpy.dtype([
+        ('time', numpy.float64),
+        ('counts_time', numpy.float64),
+        ('counts', numpy.int64, (nchannels,)),
+        ('command_time', numpy.float64),
+        ('commanded_velocity', numpy.float64, (nchannels,)),
+        ('commanded_throttle', numpy.float64, (nchannels,)),
+        ('measurement_time', numpy.float64),
+        ('measured_velocity', numpy.float64, (nchannels,)),
+        ('iteration_latency', numpy.float64),
+        ('command_latency', numpy.float64),
+        ('measurement_to_command_latency', numpy.float64)
+        ])
+
+    def __init__(self, logDir = None, buffer_length = 5*10**4, logging = True):
+        DataLog.__init__(self, logDir = logDir, buffer_length = buffer_length, logging = logging)
+        self.buffer_length = buffer_length
+        self.data = numpy.zeros(self.buffer_length, dtype = self.dtype)
+        self.index = 0 #total number of rows recorded
+
+        #per-field views avoid a structured field lookup on every record
+        self.__columns = [self.data[name] for name in self.dtype.names]
+
+        #streaming state (see startStream)
+        self.stream_chunk_length = None
+        self.__stream_file = None
+        self.__stream_queue = None
+        self.__free_chunks = None
+        self.__stream_thread = None
+        self.__stream_index = 0 #rows handed to the stream writer
+
+    def record(self, time, counts_time, counts, command_time, commanded_velocity, commanded_throttle, measurement_time, measured_velocity, iteration_latency, command_latency, measurement_to_command_latency):
+        """Write one row. Array arguments must contain one value per channel."""
+        i = self.index % self.buffer_length
+        c = self.__columns
+        c[0][i] = time
+        c[1][i] = counts_time
+        c[2][i] = counts
+        c[3][i] = command_time
+        c[4][i] = commanded_velocity
+        c[5][i] = commanded_throttle
+        c[6][i] = measurement_time
+        c[7][i] = measured_velocity
+        c[8][i] = iteration_latency
+        c[9][i] = command_latency
+        c[10][i] = measurement_to_command_latency
+        self.index += 1
+
+        if self.stream_chunk_length and self.index - self.__stream_index == self.stream_chunk_length:
+            self.__enqueueChunk()
+
+    def startStream(self, filePath, chunk_length = 1000, queue_length = 16):
+        """Start appending recorded rows to a binary stream file. Metadata set with updateLog so far is stored in the header."""
+        if self.__stream_file:
+            raise RuntimeError('Stream already started.')
+        if chunk_length > self.buffer_length:
+            raise RuntimeError('chunk_length ({0}) must not exceed buffer_length ({1}).'.format(chunk_length, self.buffer_length))
+
+        header = json.dumps({
+            'dtype': self.dtype.descr,
+            'metadata': {key: self.log[key] for key in self.metadata_keys}
+            }, default = str)
+
+        self.__stream_file = open(str(filePath), 'wb')
+        self.__stream_file.write(self.STREAM_MAGIC)
+        self.__stream_file.write(struct.pack('<I', len(header)))
+        self.__stream_file.write(header)
+        self.__stream_file.flush()
+
+        self.stream_chunk_length = chunk_length
+        self.__stream_index = self.index
+        self.__stream_queue = Queue.Queue(maxsize = queue_length)
+        self.__free_chunks = Queue.Queue()
+        for i in xrange(queue_length + 1):
+            self.__free_chunks.put(numpy.zeros(chunk_length, dtype = self.dtype))
+
+        self.__stream_thread = threading.Thread(target = self.__streamWriter, name = 'DataLogStream')
+        self.__stream_thread.daemon = True
+        self.__stream_thread.start()
+
+    def stopStream(self):
+        """Write any rows not yet streamed, wait for the writer thread and close the stream file."""
+        if not self.__stream_file:
+            return
+        if self.index > self.__stream_index:
+            self.__enqueueChunk()
+        self.stream_chunk_length = None
+        self.__stream_queue.put(None)
+        self.__stream_thread.join()
+        self.__stream_file.close()
+        self.__stream_file = None
+
+    def __enqueueChunk(self):
+        #copy rows recorded since last chunk into a free chunk and hand it to the writer thread
+        n = self.index - self.__stream_index
+        start = self.__stream_index % self.buffer_length
+        first = min(n, self.buffer_length - start) #rows before the ring buffer wraps
+        chunk = self.__free_chunks.get()
+        chunk[:first] = self.data[start:start + first]
+        chunk[first:n] = self.data[:n - first]
+        self.__stream_queue.put((chunk, n))
+        self.__stream_index = self.index
+
+    def __streamWriter(self):
+        while True:
+            item = self.__stream_queue.get()
+            if item is None:
+                return
+            chunk, n = item
+            self.__stream_file.write(chunk[:n].tostring())
+            self.__stream_file.flush()
+            os.fsync(self.__stream_file.fileno())
+            self.__free_chunks.put(chunk)
+
+    def getRecords(self):
+        """Return recorded rows in chronological order."""
+        if self.index <= self.buffer_length:
+            return self.data[:self.index]
+        start = self.index % self.buffer_length
+        return numpy.concatenate((self.data[start:], self.data[:start]))
+
+    def saveLog(self, fileDir = None, fileName = None, baseName = None):
+        self.__updateLogFromRecords(asLists = True)
+        DataLog.saveLog(self, fileDir = fileDir, fileName = fileName, baseName = baseName)
+
+    def saveColumnarLog(self, filePath, log = None):
+        if log is None:
+            self.__updateLogFromRecords(asLists = False)
+        DataLog.saveColumnarLog(self, filePath, log)
+
+    def __updateLogFromRecords(self, asLists):
+        #copy recorded rows into self.log in the nested layout used by DataLog
+        records = self.getRecords()
+        convert = (lambda x: x.tolist()) if asLists else numpy.ascontiguousarray
+        groups = {
+            'counts': 'counts_time',
+            'commanded_velocity': 'command_time',
+            'commanded_throttle': 'command_time',
+            'measured_velocity': 'measurement_time'
+            }
+        for name, time_name in groups.items():
+            self.log[name] = {'time': convert(records[time_name])}
+            for j in xrange(self.nchannels):
+                self.log[name][j] = convert(records[name][:, j])
+        for name in ['iteration_latency', 'command_latency', 'measurement_to_command_latency']:
+            self.log[name] = convert(records[name])
+
+    def openStreamLog(self, filePath):
+        """Read a stream file written by startStream. Returns (metadata, records); a partially written final row is ignored."""
+        filePath = str(filePath)
+        with open(filePath, 'rb') as f:
+            if f.read(len(self.STREAM_MAGIC)) != self.STREAM_MAGIC:
+                raise RuntimeError('{0} is not a DataLog stream file.'.format(filePath))
+            header_length = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(header_length))
+            dtype = numpy.dtype([tuple([str(field[0]), str(field[1])] + [tuple(x) for x in field[2:]]) for field in header['dtype']])
+            count = (os.path.getsize(filePath) - f.tell())//dtype.itemsize
+            records = numpy.fromfile(f, dtype = dtype, count = count)
+        return header['metadata'], records
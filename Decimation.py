@@ -0,0 +1,146 @@
+import numpy
+
+def minMaxDecimate(x, y, nbuckets):
+    """
+    Reduce (x, y) to the minimum and maximum point of each of 'nbuckets' equal-count buckets.
+
+    Returns at most 2*nbuckets points in original order, so peaks and spikes survive decimation.
+    """
+    x = numpy.asarray(x)
+    y = numpy.asarray(y)
+    n = len(y)
+    if n <= 2*nbuckets:
+        return x, y
+
+    bucket_size = n//nbuckets
+    m = bucket_size*nbuckets
+    buckets = y[:m].reshape(nbuckets, bucket_size)
+    offsets = numpy.arange(nbuckets)*bucket_size
+    imin = buckets.argmin(axis = 1) + offsets
+    imax = buckets.argmax(axis = 1) + offsets
+
+    #keep each bucket's min and max in time order
+    indices = numpy.empty(2*nbuckets, dtype = numpy.intp)
+    indices[0::2] = numpy.minimum(imin, imax)
+    indices[1::2] = numpy.maximum(imin, imax)
+    if m < n:
+        indices = numpy.append(indices, n - 1)
+    return x[indices], y[indices]
+
+
+def lttb(x, y, npoints):
+    """
+    Largest-triangle-three-buckets downsampling to 'npoints' points.
+
+    Keeps the first and last points and, from each bucket in between, the point forming the largest triangle with the previously selected point and the next bucket's mean.
+    """
+    x = numpy.asarray(x, dtype = numpy.float64)
+    y = numpy.asarray(y, dtype = numpy.float64)
+    n = len(y)
+    if npoints >= n or npoints < 3:
+        return x, y
+
+    edges = numpy.linspace(1, n - 1, npoints - 1).astype(numpy.intp)
+    indices = numpy.empty(npoints, dtype = numpy.intp)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in xrange(npoints - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        mean_x = x[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+
+        area = numpy.abs((x[a] - mean_x)*(y[start:end] - y[a]) - (x[a] - x[start:end])*(mean_y - y[a]))
+        a = start + area.argmax()
+        indices[i + 1] = a
+
+    return x[indices], y[indices]
+
+
+class DecimationPyramid:
+    """
+    Multi-resolution min/max index pyramid for fast re-decimation on zoom.
+
+    Level k holds, for every bucket of 2**k consecutive samples, the indices of its minimum and maximum. Levels are built once in O(n). A query for an x range picks the coarsest level that still gives about 'npoints' points, so each zoom costs O(npoints) instead of O(n).
+    x must be sorted (e.g. timestamps or sample numbers).
+    """
+
+    def __init__(self, x, y):
+        self.x = numpy.asarray(x)
+        self.y = numpy.asarray(y)
+
+        self.levels = [] #levels[k - 1] = (min indices, max indices) for bucket size 2**k
+        imin = imax = numpy.arange(len(self.y))
+        while len(imin) > 1:
+            pairs = len(imin)//2
+            imin = self.__combine(imin, pairs, numpy.less_equal)
+            imax = self.__combine(imax, pairs, numpy.greater_equal)
+            self.levels.append((imin, imax))
+
+    def __combine(self, indices, pairs, compare):
+        #merge neighbouring buckets, keeping the index whose value wins the comparison
+        #an unpaired last bucket is carried up unchanged
+        left = indices[0:2*pairs:2]
+        right = indices[1:2*pairs:2]
+        merged = numpy.where(compare(self.y[left], self.y[right]), left, right)
+        if len(indices) > 2*pairs:
+            merged = numpy.append(merged, indices[-1])
+        return merged
+
+    def query(self, xmin, xmax, npoints):
+        """Return decimated (x, y) covering [xmin, xmax] with roughly npoints points."""
+        i0 = max(numpy.searchsorted(self.x, xmin, side = 'left') - 1, 0)
+        i1 = min(numpy.searchsorted(self.x, xmax, side = 'right') + 1, len(self.x))
+        count = i1 - i0
+
+        level = 0
+        while level < len(self.levels) and count >> (level + 1) > npoints//2:
+            level += 1
+
+        if level == 0:
+            return self.x[i0:i1], self.y[i0:i1]
+
+        imin, imax = self.levels[level - 1]
+        b0 = i0 >> level
+        b1 = min(((i1 - 1) >> level) + 1, len(imin))
+        lo = imin[b0:b1]
+        hi = imax[b0:b1]
+        indices = numpy.empty(2*len(lo), dtype = numpy.intp)
+        indices[0::2] = numpy.minimum(lo, hi)
+        indices[1::2] = numpy.maximum(lo, hi)
+        return self.x[indices], self.y[indices]
+
+
+class DecimatedLine:
+    """
+    Matplotlib line that shows a decimated series and re-decimates from a DecimationPyramid whenever the x limits of its axes change.
+
+    'points_per_pixel' sets how many points are drawn per horizontal pixel of the axes.
+    """
+
+    def __init__(self, ax, x, y, fmt = '-', points_per_pixel = 2, **kwargs):
+        self.ax = ax
+        self.points_per_pixel = points_per_pixel
+        self.pyramid = DecimationPyramid(x, y)
+
+        npoints = self.__npoints()
+        x0, y0 = self.pyramid.query(self.pyramid.x[0], self.pyramid.x[-1], npoints) if len(self.pyramid.x) else (x, y)
+        self.line, = ax.plot(x0, y0, fmt, **kwargs)
+        ax.callbacks.connect('xlim_changed', self.update)
+
+        #matplotlib callbacks only hold a weak reference to self.update, so the axes keeps the instance alive
+        if not hasattr(ax, 'decimated_lines'):
+            ax.decimated_lines = []
+        ax.decimated_lines.append(self)
+
+    def __npoints(self):
+        return max(int(self.ax.bbox.width*self.points_per_pixel), 100)
+
+    def update(self, ax = None):
+        if not len(self.pyramid.x):
+            return
+        xmin, xmax = self.ax.get_xlim()
+        x, y = self.pyramid.query(xmin, xmax, self.__npoints())
+        self.line.set_data(x, y)
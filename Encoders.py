@@ -2,7 +2,7 @@
 
 #Basic imports
 from ctypes import *
-import sys, time
+import sys, time, threading
 from collections import deque
 from math import pi
 #Phidget specific imports
@@ -14,7 +14,11 @@ from Phidgets.Phidget import PhidgetLogLevel
 class Encoders:
     default_unit = 'rad/s'
 
-    def __init__(self, countsPerRevolution, units = default_unit):
+    #seconds per unit of the elapsed time reported by position change events
+    #(high speed encoder boards report microseconds)
+    event_time_scale = 10**(-6)
+
+    def __init__(self, countsPerRevolution, units = default_unit, eventCapture = False, eventTimeout = 0.1, velocityEstimator = None):
         self.countsPerRevolution = float(countsPerRevolution)
         print 'self.countsPerRevolution : {0}'.format(self.countsPerRevolution)
         self.max_counts = 2**30 #set max counts below max integer regular int size
@@ -25,6 +29,24 @@ class Encoders:
         #may be modified to modify interpreted direction of encoder to match intended ESC input
         self.encoder_direction = {0:1,1:1,2:1}
 
+        #event driven capture state
+        #if eventCapture is True, counts and device-side elapsed time are accumulated
+        #by the position change handler instead of polled with getPosition
+        self.eventCapture = eventCapture
+        self.eventTimeout = float(eventTimeout) #seconds without events before velocity is reported as 0
+        self.__eventLock = threading.Lock() #guards event state shared with the Phidget library thread
+        self.__eventCounts = [0, 0, 0]
+        self.__eventTimes = [0.0, 0.0, 0.0]
+        #latest (host time, device time, counts) per channel
+        #replaced as a single tuple so readers always see a consistent sample
+        self.__latestEvents = [(0.0, 0.0, 0)]*3
+        self.__prevEvents = [(0.0, 0.0, 0)]*3
+        self.__eventVelocities = [0.0, 0.0, 0.0]
+
+        #optional velocity estimator (see VelocityEstimators.py)
+        #if set, getVelocities filters (time, counts) samples instead of finite differencing
+        self.velocityEstimator = velocityEstimator
+
         #Create an encoder object
         try:
             self.encoder = Encoder()
@@ -36,6 +58,8 @@ class Encoders:
             self.encoder.setOnAttachHandler(self.__encoderAttached)
             self.encoder.setOnDetachHandler(self.__encoderDetached)
             self.encoder.setOnErrorhandler(self.__encoderError)
+            if self.eventCapture:
+                self.encoder.setOnPositionChangeHandler(self.__encoderPositionChange)
         except PhidgetException as e:
             raise RuntimeError("Phidget Error {0}: {1}".format(e.code, e.details))
 
@@ -71,12 +95,36 @@ class Encoders:
         except PhidgetException as e:
             raise RuntimeError("Phidget Exception {0}: {1}".format(e.code, e.details))
 
+    def __encoderPositionChange(self,e):
+        #runs on the Phidget library thread; only accumulates, never blocks
+        i = e.index
+        if i > 2:
+            return
+        host_time = time.time()
+        with self.__eventLock:
+            counts = self.__eventCounts[i] + e.positionChange*self.encoder_direction[i]
+            device_time = self.__eventTimes[i] + e.time*self.event_time_scale
+            self.__eventCounts[i] = counts
+            self.__eventTimes[i] = device_time
+            self.__latestEvents[i] = (host_time, device_time, counts)
+
     #External Methods
     def resetCounter(self, index):
         self.encoder.setPostion(index)
 
+    def setVelocityEstimator(self, velocityEstimator):
+        #select estimator used by getVelocities; None restores finite differencing
+        self.velocityEstimator = velocityEstimator
+        if velocityEstimator:
+            velocityEstimator.reset()
+
     def getVelocities(self):
         #return instantaneous velocities for each encoder
+        if self.velocityEstimator:
+            return self.__getEstimatedVelocities()
+        if self.eventCapture:
+            return self.__getEventVelocities()
+
         print '\n'
         print 'self.unitConversionMultiplier : {0}'.format(self.unitConversionMultiplier)
         count_array = self.returnCountArray()
@@ -106,10 +154,50 @@ class Encoders:
         #return counts array:
         #[time of measurement, encoder 0 count, encoder 1 count, encoder 2 count]
         counts_array = []
-        counts_array = [time.time()]+[self.encoder.getPosition(i)*self.encoder_direction[i] for i in xrange(3)]
+        if self.eventCapture:
+            latest = list(self.__latestEvents)
+            return [time.time()]+[latest[i][2] for i in xrange(3)]
+        measurement_time = time.time()
+        positions = self.encoder.getPositions()
+        counts_array = [measurement_time]+[positions[i]*self.encoder_direction[i] for i in xrange(3)]
         return counts_array
 
     #Internal Methods
+    def __getEstimatedVelocities(self):
+        #velocities from the selected estimator (counts/s converted to selected units)
+        count_array = self.returnCountArray()
+        estimates = self.velocityEstimator.update(count_array[0], count_array[1:])
+        multiplier = self.unitConversionMultiplier/self.countsPerRevolution
+        velocities = [count_array[0]] + [v*multiplier for v in estimates]
+
+        #reset counts to avoid exceeding max integer value
+        #estimator history is no longer continuous after a reset
+        encoders_to_reset = [i for i,x in enumerate(count_array[1:]) if abs(x)>self.max_counts]
+        for i in encoders_to_reset:
+            self.__resetCounts(i)
+        if encoders_to_reset:
+            self.velocityEstimator.reset()
+
+        return velocities
+
+    def __getEventVelocities(self):
+        #velocities from device-side event timing; no ctypes calls
+        #take one snapshot of the latest events so all channels are read together
+        now = time.time()
+        latest = list(self.__latestEvents)
+        for i in xrange(3):
+            host_time, device_time, counts = latest[i]
+            prev_host_time, prev_device_time, prev_counts = self.__prevEvents[i]
+            dt = device_time - prev_device_time
+            if dt > 0:
+                #new events arrived since last call
+                self.__eventVelocities[i] = (counts - prev_counts)/dt/self.countsPerRevolution*self.unitConversionMultiplier
+                self.__prevEvents[i] = latest[i]
+            elif now - host_time > self.eventTimeout:
+                #no events for a while; wheel is stopped
+                self.__eventVelocities[i] = 0.0
+        return [now] + list(self.__eventVelocities)
+
     def __returnVelocitiesFromCounts(self,diffCountsArray):
         #convert counts to velocity in selected units
         return [i/diffCountsArray[0]/self.countsPerRevolution*self.unitConversionMultiplier for i in diffCountsArray[1:]]
@@ -128,6 +216,10 @@ class Encoders:
     def __resetCounts(self, index):
         #reset encoder channel position to zero
         self.encoder.setPosition(index,0)
+        with self.__eventLock:
+            self.__eventCounts[index] = 0
+            self.__latestEvents[index] = (time.time(), self.__eventTimes[index], 0)
+            self.__prevEvents[index] = self.__latestEvents[index]
 
     def __setVelocityUnits(self, units):
         #toggle output between rad/s, Hz, rpm
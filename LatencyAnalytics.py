@@ -0,0 +1,207 @@
+import math
+import sys
+import numpy
+
+class LatencyHistogram:
+    """
+    Fixed-memory log-linear latency histogram (HDR histogram style).
+
+    Values between 'lowest' and 'highest' seconds are counted in buckets whose width is a fixed fraction of their value: each power-of-two range is split into 2**precision_bits sub-buckets, so the relative error of a reported percentile is below 2**-precision_bits (0.8% for the default of 7).
+    record() is O(1) and memory does not grow with the number of samples, so it can run inside the control loop. Values outside the range are clamped into the first/last bucket and counted in 'underflows'/'overflows'; min and max are tracked exactly.
+    """
+
+    default_percentiles = [50, 90, 99, 99.9]
+
+    def __init__(self, lowest = 10**(-6), highest = 10.0, precision_bits = 7):
+        self.lowest = float(lowest)
+        self.highest = float(highest)
+        self.sub_buckets = 2**int(precision_bits)
+        self.exponents = int(math.ceil(math.log(self.highest/self.lowest, 2))) + 1
+        self.nbuckets = self.exponents*self.sub_buckets
+        self.reset()
+
+    def reset(self):
+        self.counts = [0]*self.nbuckets
+        self.total = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.underflows = 0
+        self.overflows = 0
+
+    def __index(self, value):
+        #zero and negative values (e.g. clock adjustments) have no valid exponent
+        if value < self.lowest:
+            self.underflows += 1
+            return 0
+        #value = lowest * m * 2**e with m in [0.5, 1)
+        m, e = math.frexp(value/self.lowest)
+        index = (e - 1)*self.sub_buckets + int((m - 0.5)*2*self.sub_buckets)
+        if index >= self.nbuckets:
+            self.overflows += 1
+            return self.nbuckets - 1
+        return index
+
+    def record(self, value):
+        self.counts[self.__index(value)] += 1
+        self.total += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def recordArray(self, values):
+        """Vectorized record for offline use (e.g. a latency series from a log)."""
+        values = numpy.asarray(values, dtype = numpy.float64)
+        values = values[~numpy.isnan(values)]
+        if not len(values):
+            return
+
+        m, e = numpy.frexp(values/self.lowest)
+        indices = (e - 1)*self.sub_buckets + ((m - 0.5)*2*self.sub_buckets).astype(numpy.int64)
+        underflow = values < self.lowest
+        self.underflows += int(underflow.sum())
+        self.overflows += int((indices >= self.nbuckets).sum())
+        indices = numpy.clip(numpy.where(underflow, 0, indices), 0, self.nbuckets - 1)
+
+        bucket_counts = numpy.bincount(indices, minlength = self.nbuckets)
+        for i in numpy.flatnonzero(bucket_counts):
+            self.counts[i] += int(bucket_counts[i])
+
+        self.total += len(values)
+        self.sum += float(values.sum())
+        self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+        self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+
+    def add(self, other):
+        """Merge counts from another histogram with the same configuration."""
+        if (other.lowest, other.highest, other.sub_buckets) != (self.lowest, self.highest, self.sub_buckets):
+            raise RuntimeError('Cannot merge histograms with different ranges or precision.')
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.total += other.total
+        self.sum += other.sum
+        self.underflows += other.underflows
+        self.overflows += other.overflows
+        for value in [other.min, other.max]:
+            if value is not None:
+                self.max = value if self.max is None else max(self.max, value)
+                self.min = value if self.min is None else min(self.min, value)
+
+    def __bucketValue(self, index):
+        #midpoint of bucket
+        e, sub = divmod(index, self.sub_buckets)
+        return self.lowest*(0.5 + (sub + 0.5)/(2.0*self.sub_buckets))*2.0**(e + 1)
+
+    def percentile(self, p):
+        """Return the value at percentile p (0-100), or None if nothing was recorded."""
+        if not self.total:
+            return None
+        if p >= 100:
+            return self.max
+
+        target = max(int(math.ceil(p/100.0*self.total)), 1)
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            cumulative += c
+            if cumulative >= target:
+                #never report beyond the exact extremes
+                return min(max(self.__bucketValue(i), self.min), self.max)
+
+    def percentiles(self, ps = None):
+        """Return {p: value} for each requested percentile in a single pass."""
+        if ps is None:
+            ps = self.default_percentiles
+        result = dict((p, None) for p in ps)
+        if not self.total:
+            return result
+
+        targets = sorted((max(int(math.ceil(p/100.0*self.total)), 1), p) for p in ps)
+        cumulative = 0
+        t = 0
+        for i, c in enumerate(self.counts):
+            if not c:
+                continue
+            cumulative += c
+            while t < len(targets) and cumulative >= targets[t][0]:
+                p = targets[t][1]
+                result[p] = self.max if p >= 100 else min(max(self.__bucketValue(i), self.min), self.max)
+                t += 1
+            if t == len(targets):
+                break
+        return result
+
+    def mean(self):
+        return self.sum/self.total if self.total else None
+
+    def summary(self, ps = None):
+        """Return dict with count, mean, min, max and the requested percentiles ('p50', 'p99.9', ...)."""
+        result = {
+            'count': self.total,
+            'mean': self.mean(),
+            'min': self.min,
+            'max': self.max,
+            'underflows': self.underflows,
+            'overflows': self.overflows
+            }
+        for p, value in self.percentiles(ps).items():
+            result['p{0:g}'.format(p)] = value
+        return result
+
+
+class LatencyBudget:
+    """
+    Set of named LatencyHistograms with optional per-stage budgets (seconds).
+
+    Used live in the control loop (record each stage latency per iteration) and offline (fromLog). checkBudgets compares a percentile of each stage against its budget.
+    """
+
+    def __init__(self, names, budgets = None, **histogramArgs):
+        self.names = list(names)
+        self.budgets = budgets or {}
+        self.histograms = dict((name, LatencyHistogram(**histogramArgs)) for name in self.names)
+
+    def record(self, name, value):
+        self.histograms[name].record(value)
+
+    def checkBudgets(self, p = 99.9):
+        """Return {name: (percentile value, budget, within budget)} for every stage with a budget."""
+        result = {}
+        for name, budget in self.budgets.items():
+            value = self.histograms[name].percentile(p)
+            result[name] = (value, budget, value is not None and value <= budget)
+        return result
+
+    def report(self, ps = None):
+        """Return a printable table of latency statistics in milliseconds."""
+        if ps is None:
+            ps = LatencyHistogram.default_percentiles
+        columns = ['p{0:g}'.format(p) for p in ps] + ['max']
+        lines = ['{0:<35s}{1:>10s}'.format('stage (ms)', 'count') + ''.join('{0:>10s}'.format(c) for c in columns)]
+        for name in self.names:
+            summary = self.histograms[name].summary(ps)
+            values = ''.join('{0:>10.3f}'.format(summary[c]*1000) if summary[c] is not None else '{0:>10s}'.format('-') for c in columns)
+            lines.append('{0:<35s}{1:>10d}'.format(name, summary['count']) + values)
+        return '\n'.join(lines)
+
+    @classmethod
+    def fromLog(cls, data, names = None, budgets = None, **histogramArgs):
+        """Build histograms from latency series of a log returned by DataLog.openLog."""
+        if names is None:
+            names = ['iteration_latency', 'command_latency', 'measurement_to_command_latency']
+        budget = cls(names, budgets, **histogramArgs)
+        for name in names:
+            budget.histograms[name].recordArray(data[name])
+        return budget
+
+
+if __name__ == '__main__':
+    #offline analysis: python LatencyAnalytics.py log1 [log2 ...]
+    import DataLog
+    dataLog = DataLog.DataLog()
+    for fileName in sys.argv[1:]:
+        print fileName
+        print LatencyBudget.fromLog(dataLog.openLog(fileName)).report()
+        print
@@ -0,0 +1,111 @@
+import time
+import numpy
+
+class LoopScheduler:
+    """
+    Fixed-rate loop timing with deadline-miss accounting.
+
+    Iteration k is released at start_time + k*period. The scheduler sleeps until shortly before each deadline and spins for the remaining 'spin_time' seconds, which avoids the oversleep of time.sleep on a loaded system.
+
+    Jitter (release time - deadline) is kept for the last 'history_length' iterations. An iteration whose work is still running when the next deadline passes (wait() is entered after the deadline) is counted as an overrun.
+    If the release is more than one full period late, the whole periods skipped are counted in 'missed_periods' and the schedule is re-anchored to the current time instead of trying to catch up.
+    """
+
+    def __init__(self, rate, spin_time = 0.0005, history_length = 10**4):
+        if rate <= 0:
+            raise RuntimeError('Loop rate must be positive (provided {0}).'.format(rate))
+
+        self.rate = float(rate)
+        self.period = 1.0/self.rate
+        self.spin_time = float(spin_time)
+
+        self.history_length = int(history_length)
+        self.jitter = numpy.zeros(self.history_length)
+
+        self.reset()
+
+    def reset(self):
+        self.start_time = None
+        self.next_deadline = None
+        self.iterations = 0
+        self.overruns = 0 #iterations that finished after the next deadline
+        self.missed_periods = 0 #whole periods skipped when re-anchoring
+        self.max_jitter = 0.0
+        self.max_latency = 0.0 #longest time from release to next wait() call (s)
+        self.release_time = None
+
+    def wait(self):
+        """Block until the next deadline. Call once at the top of every loop iteration. Returns the release time."""
+        now = time.time()
+
+        if self.start_time is None:
+            self.start_time = now
+            self.next_deadline = now
+        else:
+            latency = now - self.release_time
+            if latency > self.max_latency:
+                self.max_latency = latency
+            if now > self.next_deadline:
+                self.overruns += 1
+
+        #sleep until just before the deadline, then spin
+        remaining = self.next_deadline - now
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+        while time.time() < self.next_deadline:
+            pass
+
+        release_time = time.time()
+        jitter = release_time - self.next_deadline
+        self.jitter[self.iterations % self.history_length] = jitter
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+        self.iterations += 1
+
+        if jitter > self.period:
+            #missed at least one full period; skip missed deadlines
+            self.missed_periods += int(jitter/self.period)
+            self.next_deadline = release_time + self.period
+        else:
+            self.next_deadline += self.period
+
+        self.release_time = release_time
+        return release_time
+
+    def run(self, step, iterations = None):
+        """Call step() once per period, forever or for the requested number of iterations."""
+        count = 0
+        while iterations is None or count < iterations:
+            self.wait()
+            step()
+            count += 1
+
+    def getStats(self):
+        """Return timing statistics for the iterations run so far."""
+        n = min(self.iterations, self.history_length)
+        jitter = self.jitter[:n]
+
+        stats = {
+            'rate': self.rate,
+            'iterations': self.iterations,
+            'overruns': self.overruns,
+            'missed_periods': self.missed_periods,
+            'max_jitter': self.max_jitter,
+            'max_latency': self.max_latency,
+            'mean_jitter': None,
+            'std_jitter': None,
+            'achieved_rate': None
+            }
+
+        if n:
+            stats['mean_jitter'] = float(jitter.mean())
+            stats['std_jitter'] = float(jitter.std())
+        if self.iterations > 1:
+            stats['achieved_rate'] = (self.iterations - 1)/(self.release_time - self.start_time)
+
+        return stats
+
+    def printStats(self):
+        stats = self.getStats()
+        for key in sorted(stats):
+            print '{0}: {1}'.format(key, stats[key])
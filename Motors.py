@@ -1,6 +1,7 @@
 #deal with nested file structure on smbus2...
 import smbus2.smbus2.smbus2 as smbus2
-from time import sleep
+from time import sleep, time
+import threading
 
 #Constants for PCA9685
 DEVICE_ADDRESS = 0x40 #default pwm driver address
@@ -33,8 +34,17 @@ class Motors:
     #fix issue where requested frequency is overshot by factor of 1/0.97
     frequency_scaling_factor = 0.97
 
+    #SMBus block transfers are limited to 32 data bytes
+    max_block_length = 32
 
-    def __init__(self, i2c_bus_num, nmotors, min_throttle_percentage, max_throttle_percentage, min_throttle_pulse_width, max_throttle_pulse_width):
+    #PWM channels on the PCA9685; any channel can be set, not only the first nmotors
+    nchannels = 16
+
+    #throttle to counts lookup table steps per throttle percent (100 -> 0.01%)
+    throttle_table_resolution = 100
+
+
+    def __init__(self, i2c_bus_num, nmotors, min_throttle_percentage, max_throttle_percentage, min_throttle_pulse_width, max_throttle_pulse_width, refresh_interval = None, asynchronous = False):
 
         #desired refresh rate; reset to exact value following setPWMfreq
         #self.PWM_frequency = float(PWM_frequency)
@@ -61,10 +71,47 @@ class Motors:
         self.prescale = None
         self.PWM_frequency = None #in Hz
         self.window_width = None #in microseconds
+        self.counts_table = None #on counts per throttle step; built in setPWMfreq
+
+        #shadow copy of the last register bytes written to each channel
+        #channels whose bytes are unchanged are not rewritten unless refresh_interval (s) has elapsed
+        #refresh_interval = None never forces a rewrite
+        self.refresh_interval = refresh_interval
+        self.register_cache = [None]*self.nchannels
+        self.register_write_time = [0.0]*self.nchannels
+
+        #register auto-increment is enabled in setPWMfreq
+        #until then, setPWM falls back to single byte writes
+        self.auto_increment = False
+
+        #keep one bus handle open for the lifetime of the object
+        self.bus = smbus2.SMBus(self.i2c_bus_num)
+        self.bus_lock = threading.RLock() #held for every bus transaction; writer thread holds it across a batch
+
+        #asynchronous mode: setPWM/setPWMs only post the newest command for each channel
+        #to a mailbox; a writer thread drains the mailbox to the bus
+        #stale commands still waiting in the mailbox are replaced (latest value wins)
+        self.asynchronous = asynchronous
+        self.mailbox = [None]*self.nchannels #(throttle, counts, post time) per channel
+        self.mailbox_condition = threading.Condition()
+        self.writer_latency = 0.0 #post-to-write delay of most recently written command (s)
+        self.max_writer_latency = 0.0
+        self.coalesced_commands = 0 #commands replaced before being written
+        self.writer_running = False
+        self.writer_thread = None
+        self.writer_error = None #exception that stopped the writer thread; raised by the next setPWM/setPWMs/stopWriter
+        self.writer_stage_durations = (float('nan'), float('nan')) #(register computation, bus write) time of the writer's latest block write (s)
+
+        #optional StageProfiler marked by setPWMs (see setProfiler)
+        self.profiler = None
+        self.profiler_stages = None
 
         #reset to remove any stored values
         self.reset()
 
+        if self.asynchronous:
+            self.startWriter()
+
     """
     Section for internal use functions
     """
@@ -73,29 +120,32 @@ class Motors:
     def reset(self):
         self.__verbose_print(self.__MODE1_status())
         self.__write_array(PCA9685_MODE1,[0x0, 0x6])
+        self.auto_increment = False
+        self.__invalidate_register_cache()
         self.__verbose_print('Device has been reset.')
         self.__verbose_print(self.__MODE1_status())
 
-    #open i2c bus, write array of bytes to address, close bus
+    #write array of bytes to address one at a time
     def __write_array(self,addr, array):
-        bus = smbus2.SMBus(self.i2c_bus_num)
-        for d in array:
-            bus.write_byte_data(DEVICE_ADDRESS,addr,d)
-            sleep(0.010)
-        bus.close()
+        with self.bus_lock:
+            for d in array:
+                self.bus.write_byte_data(DEVICE_ADDRESS,addr,d)
+                sleep(0.010)
 
-    #open i2c bus, write 1 byte of data from address, close bus
+    #write 1 byte of data to address
     def __write8(self,addr,d):
-        bus = smbus2.SMBus(self.i2c_bus_num)
-        bus.write_byte_data(DEVICE_ADDRESS,addr,d)
-        bus.close()
+        with self.bus_lock:
+            self.bus.write_byte_data(DEVICE_ADDRESS,addr,d)
+
+    #write consecutive registers starting at address in one transaction (requires auto-increment)
+    def __write_block(self,addr,data):
+        with self.bus_lock:
+            self.bus.write_i2c_block_data(DEVICE_ADDRESS,addr,data)
 
-    #open i2c bus, read 1 byte of data to address, close bus
+    #read 1 byte of data from address
     def __read8(self,addr):
-        bus = smbus2.SMBus(self.i2c_bus_num)
-        data = bus.read_byte_data(DEVICE_ADDRESS,addr)
-        bus.close()
-        return data
+        with self.bus_lock:
+            return self.bus.read_byte_data(DEVICE_ADDRESS,addr)
 
     #return formatted string of MODE1 register values
     def __MODE1_status(self):
@@ -126,35 +176,45 @@ class Motors:
         return (self.max_throttle_pulse_width - self.min_throttle_pulse_width)/(self.max_throttle_percentage - self.min_throttle_percentage)*(throttle - self.min_throttle_percentage) + self.min_throttle_pulse_width
 
     #calculate on counts by linear interpolation between min and max throttle
-    def __return_on_counts(self,throttle):
+    def __calculate_on_counts(self,throttle):
         #convert throttle required to pulse width in microseconds
         pulse_width = self.__return_pulse_width_from_throttle(throttle)
 
         #convert pulse width required to number of counts in pwm refresh window
         counts = pulse_width*self.PWM_frequency*10**(-6)*4096 - 1
-        counts = int(round(counts))
+        return int(round(counts))
+
+    #calculate on counts and resulting pulse width for a throttle
+    def __return_on_counts(self,throttle):
+        counts = self.__calculate_on_counts(throttle)
 
         #confirm pulse width output after rounding counts to nearest value
         pulse_width = self.__return_pulse_width_from_counts(counts)
-        self.__verbose_print("Calculated on counts for {0}% throttle: {1} counts".format(throttle, counts))
-        self.__verbose_print("Approximate pulse width: {0:.0f} us".format(pulse_width))
+        if verbose:
+            self.__verbose_print("Calculated on counts for {0}% throttle: {1} counts".format(throttle, counts))
+            self.__verbose_print("Approximate pulse width: {0:.0f} us".format(pulse_width))
         
         return [counts, pulse_width]
 
-    #prints debug info if 'verbose' set to True
-    def __verbose_print(self,*arg):
-        if(verbose):
-            for a in arg:
-                print a
-        return None
-
-
-    """
-    Section for external use functions
-    """
-
-    #function to set PWM output using either throttle or counts as input
-    def setPWM(self, motor_index, throttle = 0, counts = None):
+    #precompute on counts for every throttle step between min and max throttle
+    #called by setPWMfreq since counts depend on the PWM frequency
+    def __build_counts_table(self):
+        steps = (self.max_throttle_percentage - self.min_throttle_percentage)*self.throttle_table_resolution
+        self.counts_table = [self.__calculate_on_counts(self.min_throttle_percentage + float(i)/self.throttle_table_resolution) for i in xrange(steps + 1)]
+        self.__verbose_print('Built throttle to counts table with {0} entries.'.format(len(self.counts_table)))
+
+    #look up on counts for a throttle (throttle is clamped to min/max throttle)
+    def __lookup_on_counts(self,throttle):
+        index = int((throttle - self.min_throttle_percentage)*self.throttle_table_resolution + 0.5)
+        if index < 0:
+            index = 0
+        elif index >= len(self.counts_table):
+            index = len(self.counts_table) - 1
+        return self.counts_table[index]
+
+    #return LEDn_ON_L, LEDn_ON_H, LEDn_OFF_L, LEDn_OFF_H register values for a channel
+    #returns None if counts are out of range
+    def __return_register_bytes(self, motor_index, throttle = 0, counts = None):
 
         #if counts is defined, use this directly
         #otherwise, calculate counts from throttle
@@ -162,7 +222,8 @@ class Motors:
             if counts > 4095 or counts < 0:
                 print 'Error: Counts input is {0}. Counts limited to 0 to 4095 inclusive.'.format(counts)
                 return None
-            pulse_width = self.__return_pulse_width_from_counts(counts)
+        elif self.counts_table:
+            counts = self.__lookup_on_counts(throttle)
         else:
             counts, pulse_width= self.__return_on_counts(throttle)
 
@@ -171,9 +232,137 @@ class Motors:
         on = 10 #in counts, decimal
         off = counts + on #shift off time by on delay time
 
-        self.__verbose_print("Setting PWM {0}: {1}->{2}".format(motor_index, on, off))
-        #__verbose_print("Approximate pulse width: {0} us").format(pulse_width)
+        if verbose:
+            self.__verbose_print("Setting PWM {0}: {1}->{2}".format(motor_index, on, off))
+            self.__verbose_print("Approximate pulse width: {0:.0f} us".format(self.__return_pulse_width_from_counts(counts)))
+
+        return [on & 0xFF, on>>8, off & 0xFF, off>>8]
+
+    #return True if channel registers differ from shadow copy or are due for a forced refresh
+    def __register_write_required(self, motor_index, write_array, now):
+        if self.register_cache[motor_index] != write_array:
+            return True
+        if self.refresh_interval is not None and now - self.register_write_time[motor_index] >= self.refresh_interval:
+            return True
+        return False
+
+    #update shadow copy after writing channel registers
+    def __update_register_cache(self, motor_index, write_array, now):
+        self.register_cache[motor_index] = write_array
+        self.register_write_time[motor_index] = now
+
+    #forget shadow copies so the next command to each channel is written
+    def __invalidate_register_cache(self):
+        self.register_cache = [None]*self.nchannels
+        self.register_write_time = [0.0]*self.nchannels
+
+    #writer thread loop: wait for commands, take all pending commands, write the newest values
+    def __writer_loop(self):
+        while True:
+            with self.mailbox_condition:
+                while self.writer_running and not any(self.mailbox):
+                    self.mailbox_condition.wait()
+                if not self.writer_running and not any(self.mailbox):
+                    return
+                commands = self.mailbox
+                self.mailbox = [None]*self.nchannels
+
+            try:
+                with self.bus_lock:
+                    channel_throttles = []
+                    for i, command in enumerate(commands):
+                        if command is None:
+                            continue
+                        throttle, counts, post_time = command
+                        if counts:
+                            self.__write_PWM(i, counts = counts)
+                        else:
+                            channel_throttles.append((i, throttle))
+
+                    #only channels with a new command are written; consecutive channels share a block write
+                    if channel_throttles:
+                        durations = self.__write_channels(channel_throttles)
+                        if durations:
+                            self.writer_stage_durations = durations
+            except Exception as error:
+                #stop the writer and report the error to the control thread on its next call
+                with self.mailbox_condition:
+                    self.writer_error = error
+                    self.writer_running = False
+                print 'Error: Motors writer thread stopped: {0}'.format(error)
+                return
+
+            now = time()
+            oldest_post_time = min(command[2] for command in commands if command is not None)
+            self.writer_latency = now - oldest_post_time
+            if self.writer_latency > self.max_writer_latency:
+                self.max_writer_latency = self.writer_latency
+
+    #place newest command for a channel in the mailbox, replacing any unwritten command
+    def __post_command(self, motor_index, throttle, counts, post_time):
+        if self.mailbox[motor_index] is not None:
+            self.coalesced_commands += 1
+        self.mailbox[motor_index] = (throttle, counts, post_time)
+
+    #raise the exception that stopped the writer thread
+    def __raise_writer_error(self):
+        if self.writer_error is not None:
+            raise self.writer_error
+
+    #prints debug info if 'verbose' set to True
+    def __verbose_print(self,*arg):
+        if(verbose):
+            for a in arg:
+                print a
+        return None
+
 
+    """
+    Section for external use functions
+    """
+
+    #function to set PWM output using either throttle or counts as input
+    #in asynchronous mode the command is queued for the writer thread and this returns immediately
+    def setPWM(self, motor_index, throttle = 0, counts = None):
+        if not 0 <= motor_index < self.nchannels:
+            raise RuntimeError('Invalid PWM channel {0}. The PCA9685 has channels 0 to {1}.'.format(motor_index, self.nchannels - 1))
+
+        if not self.asynchronous:
+            return self.__write_PWM(motor_index, throttle, counts)
+
+        with self.mailbox_condition:
+            self.__raise_writer_error()
+            self.__post_command(motor_index, throttle, counts, time())
+            self.mailbox_condition.notify()
+
+    #function to set PWM output of motors 0..len(throttles)-1 together
+    #in asynchronous mode the commands are queued for the writer thread and this returns immediately
+    def setPWMs(self, throttles):
+        if len(throttles) > self.nchannels:
+            raise RuntimeError('{0} throttles given. The PCA9685 has {1} channels.'.format(len(throttles), self.nchannels))
+
+        if not self.asynchronous:
+            return self.__write_PWMs(throttles, self.profiler)
+
+        now = time()
+        with self.mailbox_condition:
+            self.__raise_writer_error()
+            for motor_index, throttle in enumerate(throttles):
+                self.__post_command(motor_index, throttle, None, now)
+            self.mailbox_condition.notify()
+        if self.profiler:
+            #registers are computed and written by the writer thread; report its latest block write
+            #(the time spent posting the command falls into the next marked stage)
+            pwm_duration, i2c_duration = self.writer_stage_durations
+            self.profiler.record(self.profiler_stages[0], pwm_duration)
+            self.profiler.record(self.profiler_stages[1], i2c_duration)
+
+    #write PWM output for one channel to the bus
+    def __write_PWM(self, motor_index, throttle = 0, counts = None):
+
+        write_array = self.__return_register_bytes(motor_index, throttle, counts)
+        if write_array is None:
+            return None
 
         #note: Each channel has 4 byte addresses for LED_ON_L,
         #LED_ON_H, LED_OFF_L, and LED_OFF_H. Shifting from LED0_ON_L
@@ -182,10 +371,76 @@ class Motors:
         #See PCA9865 documentation for more details.
         
         start_register = LED0_ON_L + 4*motor_index
-        write_array = [on, on>>8, off, off>>8]
 
-        for i in xrange(4):
-            self.__write8(start_register+i, write_array[i])
+        now = time()
+        if not self.__register_write_required(motor_index, write_array, now):
+            return None
+
+        if self.auto_increment:
+            self.__write_block(start_register, write_array)
+        else:
+            for i in xrange(4):
+                self.__write8(start_register+i, write_array[i])
+        self.__update_register_cache(motor_index, write_array, now)
+
+    #write PWM output of motors 0..len(throttles)-1 to the bus together
+    def __write_PWMs(self, throttles, profiler = None):
+        return self.__write_channels(enumerate(throttles), profiler)
+
+    #write PWM output for (channel, throttle) pairs
+    #LEDn registers of consecutive channels are contiguous, so each run of consecutive channels
+    #is written with auto-increment block writes (max 32 bytes per transaction)
+    #returns (register computation, bus write) durations in seconds for block writes
+    def __write_channels(self, channel_throttles, profiler = None):
+
+        if not self.auto_increment:
+            for motor_index, throttle in channel_throttles:
+                self.__write_PWM(motor_index, throttle)
+            return None
+
+        now = time()
+        runs = self.__plan_channel_writes(channel_throttles, now)
+        computed = time()
+        if profiler:
+            profiler.mark(self.profiler_stages[0])
+
+        self.__send_channel_writes(runs, now)
+        if profiler:
+            profiler.mark(self.profiler_stages[1])
+        return computed - now, time() - computed
+
+    #compute register bytes for (channel, throttle) pairs and split them into runs of consecutive channels
+    #each run is trimmed to the span of channels that changed (or are due for refresh); returns [(first channel, [register bytes, ...]), ...]
+    def __plan_channel_writes(self, channel_throttles, now):
+        runs = []
+        run = []
+        for motor_index, throttle in sorted(channel_throttles):
+            write_array = self.__return_register_bytes(motor_index, throttle)
+            if run and (write_array is None or motor_index != run[-1][0] + 1):
+                self.__append_changed_span(runs, run, now)
+                run = []
+            if write_array is not None:
+                run.append((motor_index, write_array))
+        if run:
+            self.__append_changed_span(runs, run, now)
+        return runs
+
+    def __append_changed_span(self, runs, run, now):
+        changed = [k for k, (i, a) in enumerate(run) if self.__register_write_required(i, a, now)]
+        if changed:
+            runs.append((run[changed[0]][0], [a for i, a in run[changed[0]:changed[-1] + 1]]))
+
+    #block write planned runs of channels and update the shadow copies
+    def __send_channel_writes(self, runs, now):
+        channels_per_block = self.max_block_length/4
+        for first_channel, channel_arrays in runs:
+            for k in xrange(0, len(channel_arrays), channels_per_block):
+                block = []
+                for a in channel_arrays[k:k + channels_per_block]:
+                    block.extend(a)
+                self.__write_block(LED0_ON_L + 4*(first_channel + k), block)
+            for k, a in enumerate(channel_arrays):
+                self.__update_register_cache(first_channel + k, a, now)
 
     #set refresh rate of PWM driver; set self.PWM_freq (Hz) and self.window_width (microseconds)
     def setPWMfreq(self,desired_freq):
@@ -231,6 +486,7 @@ class Motors:
         self.__verbose_print('\nEnabling auto-increment. (Bit 5)')
         self.__write8(PCA9685_MODE1, oldmode | 0xa0)
         self.__verbose_print(self.__MODE1_status())
+        self.auto_increment = True
 
         estimated_window_width = 1/estimated_output_frequency*10**6
         self.__verbose_print("Estimated window width = 1/estimated_pwm_frequency = {0:.2f}".format(1/estimated_output_frequency*10**6))
@@ -241,6 +497,63 @@ class Motors:
         self.PWM_frequency = estimated_output_frequency
         self.window_width = estimated_window_width
 
+        self.__build_counts_table()
+
+    #release the i2c bus handle
+    def close(self):
+        try:
+            self.stopWriter()
+        finally:
+            if self.bus:
+                self.bus.close()
+                self.bus = None
+
+    #start writer thread for asynchronous mode
+    def startWriter(self):
+        if self.writer_thread and self.writer_thread.is_alive():
+            return None
+        self.asynchronous = True
+        self.writer_running = True
+        self.writer_thread = threading.Thread(target = self.__writer_loop, name = 'MotorsWriter')
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    #write any pending commands, stop writer thread and return to synchronous writes
+    #raises the exception that stopped the writer thread, if any
+    def stopWriter(self):
+        if not self.writer_thread:
+            return None
+        with self.mailbox_condition:
+            self.writer_running = False
+            self.mailbox_condition.notify()
+        self.writer_thread.join()
+        self.writer_thread = None
+        self.asynchronous = False
+
+        error = self.writer_error
+        self.writer_error = None
+        self.mailbox = [None]*self.nchannels
+        if error is not None:
+            raise error
+
+    #mark 'pwm_computation' and 'i2c_write' stages of a StageProfiler in setPWMs; None (or a disabled profiler) turns marking off
+    #in asynchronous mode setPWMs records the writer thread's latest durations for both stages instead
+    def setProfiler(self, profiler, pwm_stage = 'pwm_computation', i2c_stage = 'i2c_write'):
+        if profiler and profiler.enabled:
+            self.profiler = profiler
+            self.profiler_stages = (profiler.stage(pwm_stage), profiler.stage(i2c_stage))
+        else:
+            self.profiler = None
+            self.profiler_stages = None
+
+    #return writer thread queueing statistics
+    def getWriterStats(self):
+        return {
+            'writer_latency': self.writer_latency,
+            'max_writer_latency': self.max_writer_latency,
+            'coalesced_commands': self.coalesced_commands
+            }
+
     #startup routine to enable motor controllers
     def motor_startup(self):
         #set all motor channels to neutral
@@ -10,6 +10,8 @@ __email__ = "croomjm@gmail.com"
 __status__ = "Prototype"
 
 import types
+import bisect
+import numpy
 
 class PID:
 	"""Basic PID controller class for SISO systems."""
@@ -28,7 +30,10 @@ class PID:
 	2) Anti-windup integrator with direct measurement of output
 	"""
 
-	def __init__(self,K, Ti = None, Td = None, N = None, h = None, antiWindupDict = None, setPointWeightingDict = None):
+	#longest timestep (s) stored in the coefficient cache
+	max_cached_h = 1.0
+
+	def __init__(self,K, Ti = None, Td = None, N = None, h = None, antiWindupDict = None, setPointWeightingDict = None, hResolution = 10**(-6), cacheLength = 64):
 		
 		"""Initialize required values for control loop and set behavior of required helper functions."""
 
@@ -39,6 +44,9 @@ class PID:
 		Timesteps (h):
 			If user does not input value for h (the control loop time step), h is calculated for each control loop step. If h is set, it is used as a constant for all controller calculations. In either case, a time (in seconds) is required at each time step in 'returnOutput' function.
 
+		Discretization coefficient cache:
+			In variable timing mode, the discrete coefficients (ad, bd, bi, ar) are looked up in a table keyed by h rounded to a multiple of 'hResolution' (s), so the coefficients used are exact for an h within hResolution/2 of the measured one. The table is a plain dict holding at most 'cacheLength' timesteps and nothing is evicted: it keeps the first timesteps seen (normally the loop period and its jitter around startup), and once it is full, timesteps not in it are computed exactly for the measured h on every step. setGains clears the table. Timesteps shorter than 100*hResolution (relative error above 0.5%) or longer than 'max_cached_h' (e.g. the first step or a pause) are computed exactly and not cached.
+
 		Anti-windup:
 			Anti-windup is an optional parameter that should be passed as a dict. By default, it will not be used in the control loop, which could result in undesirable behavior at or near actuator saturation (see references). If anti-windup is desired, the class must be initialized with 'antiWindup' set to a dict with the following keys:
 				Required - 'Tt':
@@ -69,6 +77,7 @@ class PID:
 			'K': None,
 			'Ti': None,
 			'Td': None,
+			'N': None,
 
 			'timing_mode': None,
 			'h': None,
@@ -84,12 +93,17 @@ class PID:
 			'ai': None,
 			'ad': None,
 			'bd': None,
-			'a0': None
+			'bi': None,
+			'ar': None,
+
+			'hResolution': None,
+			'cacheLength': None
 		}
 
 		#initialize required system values
+		#t_old is None until the first returnOutput call latches the first sample
 		self.y_old = 0
-		self.t_old = 0
+		self.t_old = None
 		self.I = 0
 		self.D = 0
 
@@ -105,7 +119,7 @@ class PID:
 				self.__setConstant(N, 'N')
 			else:
 				#if no value is provided, set to 14 (midpoint between typical values of 8 to 20 as described in Astrom)
-				self.__setConstant(N, 14)
+				self.__setConstant(14, 'N')
 
 		#determine timing mode and set parameters appropriately
 		if h:
@@ -121,14 +135,24 @@ class PID:
 		if setPointWeightingDict:
 			self.__setSetPointWeighting(setPointWeightingDict)
 
+		#discretization coefficient cache for variable timing mode
+		self.__setConstant(hResolution, 'hResolution')
+		self.parameters['cacheLength'] = int(cacheLength)
+		self.__coefficientCache = {}
+		self.__inverseResolution = 1.0/self.parameters['hResolution']
+		self.__cacheKeyRange = (100, int(self.max_cached_h*self.__inverseResolution))
+		self.cache_misses = 0
+
 		#precompute constants for controller loop
+		self.__constantCoefficients = None
 		self.__setPrecomputedGains()
 
 	def __setControllerMode(self,K,Ti,Td):
 		portions = ['P','I', 'D']
-		mode = ''.join([x for x in portions, y in [K,Ti,Td] if y!=None])
+		mode = ''.join([x for x, y in zip(portions, [K,Ti,Td]) if y!=None])
 		if mode in ['', 'D', 'ID']:
 			raise RuntimeError('User input of K = {0}, Ti = {1}, Td = {2} is invalid. Proportional gain (K) is required.'.format(K,Ti,Td))
+		self.parameters['mode'] = mode
 
 	def __setConstant(self, constant, name):
 		if type(constant) not in [int,float]:
@@ -142,7 +166,7 @@ class PID:
 
 	def __sethHandle(self, timing_mode, h = None):
 		if timing_mode == 'variable':
-			self.__returnh = lambda x: x - self.told
+			self.__returnh = lambda x: x - self.t_old
 		elif timing_mode == 'constant':
 			if type(h) not in [int, float]:
 				raise TypeError('Variable timing selected, but value of h ({0}, type: {1}) provided is not int or float type.'.format(h, type(h)))
@@ -153,6 +177,9 @@ class PID:
 		else:
 			raise RuntimeError("Timing mode '{0}' is invalid. Please select from 'constant' and 'variable.'".format(timing_mode))
 
+		self.parameters['timing_mode'] = timing_mode
+		self.parameters['h'] = h
+
 	def __setAntiWindup(self, antiWindupDict):
 		"""
 		Sets the required anti-windup parameters in self.parameters.
@@ -214,18 +241,60 @@ class PID:
 		K = self.parameters['K']
 		Ti = self.parameters['Ti']
 		Td = self.parameters['Td']
+		N = self.parameters['N']
 		Tt = self.parameters['Tt']
-		b = self.parameters['b']
-		c = self.parameters['c']
+
+		#absent terms have zero coefficients
+		self.parameters['ad'] = lambda h: 0.0
+		self.parameters['bd'] = lambda h: 0.0
+		self.parameters['bi'] = lambda h: 0.0
+		self.parameters['ar'] = lambda h: 0.0
 
 		if mode in ['PD', 'PID']:
 			self.parameters['ad'] = lambda h: Td/(Td + N*h)
-			self.parameters['bd'] = lambda h: -Td*K*N/(Td + N*h)
+			self.parameters['bd'] = lambda h: Td*K*N/(Td + N*h)
 		if mode in ['PI', 'PID']:
 			self.parameters['bi'] = lambda h: K*h/Ti
 
 		if self.parameters['antiWindup']:
-			self.parameters['a0'] = 1/Tt 
+			self.parameters['ar'] = lambda h: h/Tt
+
+		if self.parameters['timing_mode'] == 'constant':
+			self.__constantCoefficients = self.__computeCoefficients(self.parameters['h'])
+
+	def __computeCoefficients(self, h):
+		return (self.parameters['ad'](h), self.parameters['bd'](h), self.parameters['bi'](h), self.parameters['ar'](h))
+
+	def __returnCoefficients(self, h):
+		"""Return (ad, bd, bi, ar) for timestep h (variable timing mode), from the table keyed by h quantized to hResolution."""
+		key = int(h*self.__inverseResolution + 0.5)
+		coefficients = self.__coefficientCache.get(key)
+		if coefficients is not None:
+			return coefficients
+
+		keyMin, keyMax = self.__cacheKeyRange
+		if key < keyMin or key > keyMax:
+			return self.__computeCoefficients(h)
+
+		self.cache_misses += 1
+		if len(self.__coefficientCache) >= self.parameters['cacheLength']:
+			return self.__computeCoefficients(h)
+		coefficients = self.__computeCoefficients(key*self.parameters['hResolution'])
+		self.__coefficientCache[key] = coefficients
+		return coefficients
+
+	def setGains(self, K = None, Ti = None, Td = None):
+		"""Change controller gains without resetting integrator or derivative state. The controller mode ('P', 'PI', ...) cannot be changed."""
+		mode = self.parameters['mode']
+		for name, value, portion in [('K', K, 'P'), ('Ti', Ti, 'I'), ('Td', Td, 'D')]:
+			if value is None:
+				continue
+			if portion not in mode:
+				raise RuntimeError("Cannot set {0} for controller in '{1}' mode.".format(name, mode))
+			self.__setConstant(value, name)
+
+		self.__setPrecomputedGains()
+		self.__coefficientCache.clear()
 
 	def getParameters(self):
 		return self.parameters
@@ -238,18 +307,27 @@ class PID:
 	def returnOutput(self,ysp,measured_state):
 		"""Take in commanded state and measured state. Return output."""
 		t, y = measured_state
-		h = self.parameters['h'](t)
-
 		P = self.parameters['K']*(self.parameters['b']*ysp-y)
-		self.D = self.parameters['ad'](h)*self.D - self.parameters['bd'](h)*(y-self.y_old)
+
+		if self.t_old is None:
+			#first sample: no timestep yet, so no derivative or integral update
+			v = P + self.I
+			u = self.parameters['actuatorModel'](v) if self.parameters['antiWindup'] else v
+			self.t_old = t
+			self.y_old = y
+			return u
+
+		ad, bd, bi, ar = self.__constantCoefficients or self.__returnCoefficients(self.__returnh(t))
+
+		self.D = ad*self.D - bd*(y-self.y_old)
 
 		v = P + self.D + self.I
 
 		if self.parameters['antiWindup']:
 			u = self.parameters['actuatorModel'](v)
-			self.I += self.parameters['bi'](h)*(ysp - self.y_old) + self.parameters['a0']*(u-v)
+			self.I += bi*(ysp - self.y_old) + ar*(u-v)
 		else:
-			self.I += self.parameters['bi'](h)*(ysp - self.y_old)
+			self.I += bi*(ysp - self.y_old)
 			u = v
 
 		self.t_old = t
@@ -258,5 +336,216 @@ class PID:
 		return u
 
 
+class PIDArray:
+	"""Vectorized PID controller for N independent axes (e.g. the three reaction wheels)."""
+
+	"""
+	Same discrete update as PID, but gains, limits and controller state are NumPy vectors so all axes are updated in one step:
+		P = K*(b*ysp - y)
+		D = ad*D - bd*(y - y_old), with ad = Td/(Td + N*h) and bd = K*Td*N/(Td + N*h)
+		v = P + I + D
+		u = clip(v, uMin, uMax)
+		I = I + bi*(ysp - y_old) + ar*(u - v), with bi = K*h/Ti and ar = h/Tt
+	Each axis gives the same output as a PID with the same gains, setPointWeightingDict = {'b': b} and, if limits are given, antiWindupDict = {'Tt': Tt, 'actuatorModel': clip to [uMin, uMax]}. Differences: variable timesteps are not quantized to a coefficient table, and a repeated timestamp returns the previous output.
+
+	Every gain may be a scalar (shared by all axes) or a sequence with one value per axis.
+	Ti = None (or inf) removes the integral term and Td = None (or 0) removes the derivative term, for all axes or, as elements of a per-axis sequence (e.g. Ti = [0.5, None, 0.5]), for single axes. None elements of Tt, uMin and uMax also take their defaults.
+	b is the set-point weight of the proportional term (0 by default, as in PID).
+
+	Anti-windup is enabled by giving actuator limits uMin and/or uMax. The saturation is applied to the output, so no actuator model function is called per step.
+	Tt defaults to sqrt(Ti*Td) (rule of thumb in Astrom), or Ti for axes without a derivative term.
+
+	If h is given, the discrete coefficients are computed once. Otherwise h is the time since the previous call and the coefficients are computed with vector operations each step.
+	"""
+
+	def __init__(self, K, Ti = None, Td = None, N = 14, h = None, b = 0, Tt = None, uMin = None, uMax = None, naxes = None):
+		if naxes is None:
+			naxes = max([numpy.size(x) for x in [K, Ti, Td, b, uMin, uMax] if x is not None])
+		self.naxes = int(naxes)
+
+		self.K = self.__vector(K, 'K')
+		self.Ti = self.__vector(self.__replaceNone(Ti, numpy.inf), 'Ti', positive = True)
+		self.Td = self.__vector(self.__replaceNone(Td, 0.0), 'Td')
+		self.N = self.__vector(N, 'N', positive = True)
+		self.b = self.__vector(b, 'b')
+
+		self.uMin = self.__vector(self.__replaceNone(uMin, -numpy.inf), 'uMin', signed = True)
+		self.uMax = self.__vector(self.__replaceNone(uMax, numpy.inf), 'uMax', signed = True)
+		self.antiWindup = uMin is not None or uMax is not None
+		if numpy.any(self.uMin > self.uMax):
+			raise RuntimeError('uMin ({0}) must not be greater than uMax ({1}).'.format(self.uMin, self.uMax))
+
+		TtDefault = numpy.where(self.Td > 0, numpy.sqrt(self.Ti*self.Td), self.Ti)
+		self.Tt = self.__vector(self.__replaceNone(Tt, TtDefault), 'Tt', positive = True)
+
+		if h is not None:
+			if type(h) not in [int, float] or h <= 0:
+				raise RuntimeError('Value of h provided ({0}, type: {1}) must be a positive int or float.'.format(h, type(h)))
+			h = float(h)
+		self.h = h
+
+		if self.h is not None:
+			self.ad, self.bd, self.bi, self.ar = self.__coefficients(self.h)
+
+		self.reset()
+
+	def __replaceNone(self, value, default):
+		#None, or None elements of a per-axis sequence, take the default (scalar or one value per axis)
+		if value is None:
+			return default
+		if numpy.ndim(value) == 0:
+			return value
+		default = numpy.broadcast_to(default, (len(value),))
+		return [default[i] if x is None else x for i, x in enumerate(value)]
+
+	def __vector(self, value, name, positive = False, signed = False):
+		vector = numpy.array(value, dtype = numpy.float64)
+		if vector.ndim == 0:
+			vector = numpy.repeat(vector, self.naxes)
+		if vector.shape != (self.naxes,):
+			raise RuntimeError('{0} must be a scalar or have one value per axis ({1} axes, provided {2}).'.format(name, self.naxes, value))
+		if not signed and numpy.any(vector < 0):
+			raise RuntimeError('Invalid value for {0} ({1}). Negative value will cause controller to diverge.'.format(name, value))
+		if positive and numpy.any(vector == 0):
+			raise RuntimeError('Invalid value for {0} ({1}). Value must be positive.'.format(name, value))
+		return vector
+
+	def __coefficients(self, h):
+		Td = self.Td
+		NTd = Td + self.N*h
+		ad = Td/NTd
+		bd = self.K*self.N*ad
+		bi = self.K*h/self.Ti
+		ar = h/self.Tt
+		return ad, bd, bi, ar
+
+	def reset(self):
+		"""Clear integrator and derivative state (e.g. when the loop is restarted)."""
+		self.I = numpy.zeros(self.naxes)
+		self.D = numpy.zeros(self.naxes)
+		self.y_old = None
+		self.t_old = None
+		self.u = numpy.zeros(self.naxes)
+
+	def getParameters(self):
+		parameters = dict((name, getattr(self, name).tolist()) for name in ['K', 'Ti', 'Td', 'N', 'b', 'Tt', 'uMin', 'uMax'])
+		parameters['h'] = self.h
+		parameters['antiWindup'] = self.antiWindup
+		return parameters
+
+	def printParameters(self):
+		parameters = self.getParameters()
+		for i in parameters:
+			print '{0}: {1}'.format(i, parameters[i])
+
+	def returnOutput(self, ysp, measured_state):
+		"""Take in commanded states and measured state (t, y) for all axes. Return output array (one value per axis)."""
+		t, y = measured_state
+		y = numpy.asarray(y, dtype = numpy.float64)
+		ysp = numpy.asarray(ysp, dtype = numpy.float64)
+
+		if self.y_old is None:
+			#first sample: no derivative or integral update without a previous measurement
+			self.y_old = y.copy()
+			self.t_old = t
+			v = self.K*(self.b*ysp - y) + self.I
+			self.u = numpy.clip(v, self.uMin, self.uMax)
+			return self.u
+
+		if self.h is None:
+			h = t - self.t_old
+			if h <= 0:
+				#repeated timestamp; keep previous output
+				return self.u
+			ad, bd, bi, ar = self.__coefficients(h)
+		else:
+			ad, bd, bi, ar = self.ad, self.bd, self.bi, self.ar
+
+		P = self.K*(self.b*ysp - y)
+		self.D *= ad
+		self.D -= bd*(y - self.y_old)
+		v = P + self.I + self.D
+
+		if self.antiWindup:
+			u = numpy.clip(v, self.uMin, self.uMax)
+			self.I += bi*(ysp - self.y_old) + ar*(u - v)
+		else:
+			u = v
+			self.I += bi*(ysp - self.y_old)
+
+		self.y_old[:] = y
+		self.t_old = t
+		self.u = u
+		return u
+
+
+class GainScheduledPID:
+	"""Gain scheduling layer over a PID controller, keyed by measured wheel velocity."""
+
+	"""
+	Gains (K, Ti, Td) are given in a table at increasing wheel velocities (e.g. from tuning at several operating points). Each step, the gains for the measured velocity are found by binary search in the table and linear interpolation between neighbouring entries; outside the table the end values are used.
+	The PID is only updated (PID.setGains) when an interpolated gain differs from the active gain by more than 'tolerance' (relative), so the discrete coefficients and their cache are not recomputed every step. Integrator and derivative state are kept when gains change.
+
+	If 'symmetric' is True, the table is indexed by the magnitude of the velocity, so it only needs non-negative velocities.
+	"""
 
+	def __init__(self, pid, velocities, K, Ti = None, Td = None, tolerance = 0.01, symmetric = True):
+		self.pid = pid
+		self.velocities = [float(v) for v in velocities]
+		if not self.velocities or any(v1 <= v0 for v0, v1 in zip(self.velocities[:-1], self.velocities[1:])):
+			raise RuntimeError('Gain schedule velocities must be strictly increasing (provided {0}).'.format(velocities))
+
+		self.table = {}
+		for name, values in [('K', K), ('Ti', Ti), ('Td', Td)]:
+			if values is None:
+				continue
+			values = [float(x) for x in values]
+			if len(values) != len(self.velocities):
+				raise RuntimeError('Gain schedule for {0} has {1} values for {2} velocities.'.format(name, len(values), len(self.velocities)))
+			self.table[name] = values
+
+		self.tolerance = float(tolerance)
+		self.symmetric = symmetric
+		self.updates = 0 #number of times the PID gains were changed
+
+		self.active = self.returnGains(0.0)
+		self.pid.setGains(**self.active)
+
+	def returnGains(self, velocity):
+		"""Return dict of interpolated gains for the given wheel velocity."""
+		if self.symmetric:
+			velocity = abs(velocity)
+		velocities = self.velocities
+		i = bisect.bisect_right(velocities, velocity)
+		if i == 0:
+			return dict((name, values[0]) for name, values in self.table.items())
+		if i == len(velocities):
+			return dict((name, values[-1]) for name, values in self.table.items())
+
+		f = (velocity - velocities[i - 1])/(velocities[i] - velocities[i - 1])
+		return dict((name, values[i - 1] + f*(values[i] - values[i - 1])) for name, values in self.table.items())
 
+	def getParameters(self):
+		parameters = self.pid.getParameters().copy()
+		parameters['schedule_velocities'] = self.velocities
+		parameters['schedule'] = self.table
+		return parameters
+
+	def printParameters(self):
+		self.pid.printParameters()
+
+	def returnOutput(self, ysp, measured_state, velocity = None):
+		"""Same as PID.returnOutput. The measured value is used as the scheduling velocity unless 'velocity' is given."""
+		if velocity is None:
+			velocity = measured_state[1]
+
+		gains = self.returnGains(velocity)
+		active = self.active
+		for name, value in gains.items():
+			if abs(value - active[name]) > self.tolerance*abs(active[name]):
+				self.pid.setGains(**gains)
+				self.active = gains
+				self.updates += 1
+				break
+
+		return self.pid.returnOutput(ysp, measured_state)
@@ -46,6 +46,15 @@ class Encoder(Phidget):
         except RuntimeError:
             raise
         
+        #typed library functions for frequently called getters
+        self.__getPosition = PhidgetLibrary.getFunction('CPhidgetEncoder_getPosition')
+        self.__getIndexPosition = PhidgetLibrary.getFunction('CPhidgetEncoder_getIndexPosition')
+        self.__getEnabled = PhidgetLibrary.getFunction('CPhidgetEncoder_getEnabled')
+        self.__getInputState = PhidgetLibrary.getFunction('CPhidgetEncoder_getInputState')
+        
+        #persistent output buffers for getPositions, allocated on first use
+        self.__positionBuffers = None
+        
         if sys.platform == 'win32':
             self.__INPUTCHANGEHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p, c_int, c_int)
             self.__POSITIONCHANGEHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p, c_int, c_int, c_int)
@@ -77,7 +86,7 @@ class Encoder(Phidget):
         position = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetEncoder_getPosition(self.handle, c_int(index), byref(position))
+            result = self.__getPosition(self.handle, index, byref(position))
         except RuntimeError:
             raise
         
@@ -86,6 +95,61 @@ class Encoder(Phidget):
         else:
             return position.value
 
+    def getPositions(self, indexPositions=False, enabled=False):
+        """Returns the positions of all encoders in one call.
+        
+        Positions are read back to back into a persistent ctypes buffer, which keeps per-call overhead and the skew between channels small.
+        libphidget21 has no bulk read, so the readings are not atomic with respect to incoming USB packets.
+        
+        Parameters:
+            indexPositions<boolean>: also return the index position of every encoder.
+            enabled<boolean>: also return the enabled state of every encoder.
+        
+        Returns:
+            A tuple with the position of each encoder <int>.
+            If indexPositions or enabled is True, a tuple (positions, indexPositions, enabledStates) is returned instead, with None for the parts that were not requested.
+        
+        Exceptions:
+            RuntimeError - If current platform is not supported/phidget c dll cannot be found
+            PhidgetException: If this Phidget is not opened and attached.
+        """
+        if self.__positionBuffers is None:
+            count = self.getEncoderCount()
+            buffers = [(c_int * count)() for i in range(3)]
+            #one c_int view per element so typed functions accept a reference into the shared buffer
+            refs = [[byref(c_int.from_buffer(buffer, i * sizeof(c_int))) for i in range(count)] for buffer in buffers]
+            self.__positionBuffers = (buffers, refs)
+        buffers, refs = self.__positionBuffers
+        
+        handle = self.handle
+        getPosition = self.__getPosition
+        for index, ref in enumerate(refs[0]):
+            result = getPosition(handle, index, ref)
+            if result > 0:
+                raise PhidgetException(result)
+        positions = tuple(buffers[0])
+        
+        if not (indexPositions or enabled):
+            return positions
+        
+        indexPositionValues = None
+        if indexPositions:
+            for index, ref in enumerate(refs[1]):
+                result = self.__getIndexPosition(handle, index, ref)
+                if result > 0:
+                    raise PhidgetException(result)
+            indexPositionValues = tuple(buffers[1])
+        
+        enabledStates = None
+        if enabled:
+            for index, ref in enumerate(refs[2]):
+                result = self.__getEnabled(handle, index, ref)
+                if result > 0:
+                    raise PhidgetException(result)
+            enabledStates = tuple(value == 1 for value in buffers[2])
+        
+        return (positions, indexPositionValues, enabledStates)
+
     def setPosition(self, index, position):
         """Sets the position of a specific encoder.
         
@@ -127,7 +191,7 @@ class Encoder(Phidget):
         indexPositon = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetEncoder_getIndexPosition(self.handle, c_int(index), byref(indexPositon))
+            result = self.__getIndexPosition(self.handle, index, byref(indexPositon))
         except RuntimeError:
             raise
         
@@ -154,7 +218,7 @@ class Encoder(Phidget):
         enabledState = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetEncoder_getEnabled(self.handle, c_int(index), byref(enabledState))
+            result = self.__getEnabled(self.handle, index, byref(enabledState))
         except RuntimeError:
             raise
         
@@ -211,7 +275,7 @@ class Encoder(Phidget):
         inputState = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetEncoder_getInputState(self.handle, c_int(index), byref(inputState))
+            result = self.__getInputState(self.handle, index, byref(inputState))
         except RuntimeError:
             raise
         
@@ -278,7 +342,10 @@ class Encoder(Phidget):
                 state = True
             else:
                 state = False
-            self.__inputChange(InputChangeEventArgs(self, index, state))
+            if self.eventDispatcher != None:
+                self.eventDispatcher.post(self.__inputChange, InputChangeEventArgs, (self, index, state))
+            else:
+                self.__inputChange(InputChangeEventArgs(self, index, state))
         return 0
 
     def setOnInputChangeHandler(self, inputChangeHandler):
@@ -312,7 +379,10 @@ class Encoder(Phidget):
 
     def __nativePositionChangeEvent(self, handle, usrptr, index, time, position):
         if self.__positionChange != None:
-            self.__positionChange(EncoderPositionChangeEventArgs(self, index, time, position))
+            if self.eventDispatcher != None:
+                self.eventDispatcher.post(self.__positionChange, EncoderPositionChangeEventArgs, (self, index, time, position))
+            else:
+                self.__positionChange(EncoderPositionChangeEventArgs(self, index, time, position))
         return 0
 
     def setOnPositionChangeHandler(self, positionChangeHandler):
@@ -49,6 +49,12 @@ class InterfaceKit(Phidget):
         except RuntimeError:
             raise
         
+        #typed library functions for frequently called getters
+        self.__getInputState = PhidgetLibrary.getFunction('CPhidgetInterfaceKit_getInputState')
+        self.__getSensorValue = PhidgetLibrary.getFunction('CPhidgetInterfaceKit_getSensorValue')
+        self.__getSensorRawValue = PhidgetLibrary.getFunction('CPhidgetInterfaceKit_getSensorRawValue')
+        self.__getOutputState = PhidgetLibrary.getFunction('CPhidgetInterfaceKit_getOutputState')
+        
         if sys.platform == 'win32':
             self.__INPUTCHANGEHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p, c_int, c_int)
             self.__OUTPUTCHANGEHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p, c_int, c_int)
@@ -106,7 +112,7 @@ class InterfaceKit(Phidget):
         inputState = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetInterfaceKit_getInputState(self.handle, c_int(index), byref(inputState))
+            result = self.__getInputState(self.handle, index, byref(inputState))
         except RuntimeError:
             raise
         
@@ -202,7 +208,7 @@ class InterfaceKit(Phidget):
         sensorValue = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetInterfaceKit_getSensorValue(self.handle, c_int(index), byref(sensorValue))
+            result = self.__getSensorValue(self.handle, index, byref(sensorValue))
         except RuntimeError:
             raise
         
@@ -230,7 +236,7 @@ class InterfaceKit(Phidget):
         sensorValue = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetInterfaceKit_getSensorRawValue(self.handle, c_int(index), byref(sensorValue))
+            result = self.__getSensorRawValue(self.handle, index, byref(sensorValue))
         except RuntimeError:
             raise
         
@@ -470,7 +476,7 @@ class InterfaceKit(Phidget):
         outputState = c_int()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetInterfaceKit_getOutputState(self.handle, c_int(index), byref(outputState))
+            result = self.__getOutputState(self.handle, index, byref(outputState))
         except RuntimeError:
             raise
         
@@ -12,9 +12,14 @@ from ctypes import *
 from Phidgets.PhidgetLibrary import PhidgetLibrary
 from Phidgets.Phidget import Phidget
 from Phidgets.PhidgetException import PhidgetErrorCodes, PhidgetException
-from Phidgets.Events.Events import SpatialDataEventArgs, AttachEventArgs
+from Phidgets.Events.Events import SpatialDataEventArgs, SpatialDataBlockEventArgs, AttachEventArgs
 import sys
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class CPhidget_Timestamp(Structure):
     _fields_ = [("seconds",c_int),("microSeconds",c_int)]
 
@@ -91,15 +96,24 @@ class Spatial(Phidget):
         
         self.__attach = None
         self.__spatialData = None;
+        self.__spatialDataBlock = None
         
         self.__onAttach = None
         self.__onSpatialData = None;
         
+        self.__blockData = None
+        self.__blockTimestamp = None
+        
         try:
             PhidgetLibrary.getDll().CPhidgetSpatial_create(byref(self.handle))
         except RuntimeError:
             raise
         
+        #typed library functions for frequently called getters
+        self.__getAcceleration = PhidgetLibrary.getFunction('CPhidgetSpatial_getAcceleration')
+        self.__getAngularRate = PhidgetLibrary.getFunction('CPhidgetSpatial_getAngularRate')
+        self.__getMagneticField = PhidgetLibrary.getFunction('CPhidgetSpatial_getMagneticField')
+        
         if sys.platform == 'win32':
             self.__ATTACHHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p)
             self.__SPATIALDATAHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p, POINTER(c_long), c_int)
@@ -158,7 +172,7 @@ class Spatial(Phidget):
         value = c_double()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetSpatial_getAcceleration(self.handle, c_int(index), byref(value))
+            result = self.__getAcceleration(self.handle, index, byref(value))
         except RuntimeError:
             raise
         
@@ -256,7 +270,7 @@ class Spatial(Phidget):
         value = c_double()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetSpatial_getAngularRate(self.handle, c_int(index), byref(value))
+            result = self.__getAngularRate(self.handle, index, byref(value))
         except RuntimeError:
             raise
         
@@ -348,7 +362,7 @@ class Spatial(Phidget):
         value = c_double()
         
         try:
-            result = PhidgetLibrary.getDll().CPhidgetSpatial_getMagneticField(self.handle, c_int(index), byref(value))
+            result = self.__getMagneticField(self.handle, index, byref(value))
         except RuntimeError:
             raise
         
@@ -548,6 +562,12 @@ class Spatial(Phidget):
             raise PhidgetException(result)
 
     def __nativeSpatialDataEvent(self, handle, usrptr, data, count):
+        if self.__spatialDataBlock != None:
+            self.__deliverSpatialDataBlock(data, count)
+        
+        if self.__spatialData == None:
+            return 0
+        
         spatialDataCollection = []
         for i in range(count):
             data2 = cast(data[i], POINTER(CPhidgetSpatial_SpatialEventData))
@@ -566,10 +586,65 @@ class Spatial(Phidget):
             
             spatialDataCollection.append(SpatialEventData(data2[0], arg0, arg1, arg2))
         
-        if self.__spatialData != None:
+        if self.eventDispatcher != None:
+            self.eventDispatcher.post(self.__spatialData, SpatialDataEventArgs, (self, spatialDataCollection))
+        else:
             self.__spatialData(SpatialDataEventArgs(self, spatialDataCollection))
         return 0
 
+    def __allocateBlock(self, length):
+        #structured array with the same memory layout as CPhidgetSpatial_SpatialEventData, so each sample is copied with a single memmove
+        dtype = numpy.dtype([('acceleration', numpy.float64, 3), ('angularRate', numpy.float64, 3), ('magneticField', numpy.float64, 3), ('seconds', numpy.intc), ('microSeconds', numpy.intc)])
+        if dtype.itemsize != sizeof(CPhidgetSpatial_SpatialEventData):
+            raise RuntimeError('Unexpected CPhidgetSpatial_SpatialEventData size.')
+        self.__blockData = numpy.zeros(length, dtype=dtype)
+        self.__blockTimestamp = numpy.zeros(length)
+
+    def __deliverSpatialDataBlock(self, data, count):
+        if count > len(self.__blockData):
+            self.__allocateBlock(count)
+        
+        block = self.__blockData
+        address = block.ctypes.data
+        size = block.itemsize
+        for i in range(count):
+            memmove(address + i*size, data[i], size)
+        
+        block = block[:count]
+        timestamp = self.__blockTimestamp[:count]
+        numpy.multiply(block['microSeconds'], 10**(-6), out=timestamp)
+        timestamp += block['seconds']
+        
+        #axes not measured in a sample are flagged with 1e300
+        fields = []
+        for name in ('acceleration', 'angularRate', 'magneticField'):
+            values = block[name]
+            values[values == 1e300] = numpy.nan
+            fields.append(values)
+        
+        if self.eventDispatcher != None:
+            #buffers are reused by the next event, so queued events get their own copy
+            self.eventDispatcher.post(self.__spatialDataBlock, SpatialDataBlockEventArgs, (self, timestamp.copy(), fields[0].copy(), fields[1].copy(), fields[2].copy()))
+        else:
+            self.__spatialDataBlock(SpatialDataBlockEventArgs(self, timestamp, fields[0], fields[1], fields[2]))
+
+    def __registerSpatialDataHandler(self):
+        if self.__spatialData == None and self.__spatialDataBlock == None:
+            self.__onSpatialData = None
+        elif self.__onSpatialData == None:
+            self.__onSpatialData = self.__SPATIALDATAHANDLER(self.__nativeSpatialDataEvent)
+        
+        try:
+            result = PhidgetLibrary.getDll().CPhidgetSpatial_set_OnSpatialData_Handler(self.handle, self.__onSpatialData, None)
+        except RuntimeError:
+            self.__spatialData = None
+            self.__spatialDataBlock = None
+            self.__onSpatialData = None
+            raise
+        
+        if result > 0:
+            raise PhidgetException(result)
+
     def setOnSpatialDataHandler(self, spatialDataHandler):
         """Sets the spatial data event handler.
         
@@ -583,22 +658,30 @@ class Spatial(Phidget):
             RuntimeError - If current platform is not supported/phidget c dll cannot be found
             PhidgetException
         """
-        if spatialDataHandler == None:
-            self.__spatialData = None
-            self.__onSpatialData = None
-        else:
-            self.__spatialData = spatialDataHandler
-            self.__onSpatialData = self.__SPATIALDATAHANDLER(self.__nativeSpatialDataEvent)
+        self.__spatialData = spatialDataHandler
+        self.__registerSpatialDataHandler()
+
+    def setOnSpatialDataBlockHandler(self, spatialDataBlockHandler, maxSamples=64):
+        """Sets the spatial data block event handler.
         
-        try:
-            result = PhidgetLibrary.getDll().CPhidgetSpatial_set_OnSpatialData_Handler(self.handle, self.__onSpatialData, None)
-        except RuntimeError:
-            self.__spatialData = None
-            self.__onSpatialData = None
-            raise
+        Same event as the spatial data event, but all samples of the event are copied directly into preallocated NumPy arrays and delivered as one SpatialDataBlockEventArgs,
+        instead of creating a SpatialEventData object per sample. Use this at high data rates.
+        Can be used together with the spatial data event handler.
         
-        if result > 0:
-            raise PhidgetException(result)
+        Parameters:
+            spatialDataBlockHandler: hook to the spatialDataBlockHandler callback function.
+            maxSamples<int>: initial number of samples the buffers can hold (grown if an event has more).
+        
+        Exceptions:
+            RuntimeError - If current platform is not supported/phidget c dll cannot be found, or NumPy is not installed
+            PhidgetException
+        """
+        if spatialDataBlockHandler != None:
+            if numpy == None:
+                raise RuntimeError('NumPy is required for spatial data blocks.')
+            self.__allocateBlock(maxSamples)
+        self.__spatialDataBlock = spatialDataBlockHandler
+        self.__registerSpatialDataHandler()
 
     def __nativeAttachEvent(self, handle, usrptr):
         self.__numAccelAxes = self.getAccelerationAxisCount()
@@ -606,7 +689,10 @@ class Spatial(Phidget):
         self.__numCompassAxes = self.getCompassAxisCount()
         
         if self.__attach != None:
-            self.__attach(AttachEventArgs(self))
+            if self.eventDispatcher != None:
+                self.eventDispatcher.post(self.__attach, AttachEventArgs, (self,))
+            else:
+                self.__attach(AttachEventArgs(self))
         return 0
     
     def setOnAttachHandler(self, attachHandler):
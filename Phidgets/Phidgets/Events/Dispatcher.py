@@ -0,0 +1,143 @@
+"""Decoupled delivery of Phidget events.
+
+By default, Phidget event handlers run directly on the libphidget21 callback thread, so a slow handler stalls the USB read thread.
+An EventDispatcher assigned with Phidget.setEventDispatcher makes the native callbacks only append a compact tuple to a bounded queue.
+The events are then delivered in batches from a consumer thread (start) or from any loop that calls drain.
+"""
+
+import sys
+import threading
+import traceback
+from collections import deque
+
+
+class EventDispatcher:
+    """Bounded event queue between the native callback thread and user handlers.
+    
+    post() is called from native callbacks. It appends (handler, argsClass, args) to a deque, which is safe without a lock because deque.append and deque.popleft are atomic in CPython.
+    If the queue already holds maxsize events, the new event is dropped and counted in overflows.
+    
+    Handlers registered with deliverBatches receive a list of raw argument tuples for consecutive events instead of one EventArgs object per event, which avoids building EventArgs objects at high event rates.
+    All other handlers are called with the usual EventArgs object, built on the consumer side.
+    
+    An exception raised by a handler is printed to stderr and counted in failures; delivery continues with the next event.
+    
+    Properties:
+        overflows<int>: Number of events dropped because the queue was full.
+        delivered<int>: Number of events delivered to handlers without an exception.
+        failures<int>: Number of events whose handler raised an exception.
+        lastError<Exception>: Most recent exception raised by a handler, or None.
+        maxDepth<int>: Largest queue length seen by the consumer.
+    """
+    def __init__(self, maxsize=4096, batchSize=256):
+        """Creates a dispatcher.
+        
+        Parameters:
+            maxsize<int>: Maximum number of queued events.
+            batchSize<int>: Maximum number of events delivered per drain.
+        """
+        self.maxsize = maxsize
+        self.batchSize = batchSize
+        self.overflows = 0
+        self.delivered = 0
+        self.failures = 0
+        self.lastError = None
+        self.maxDepth = 0
+        
+        self.__queue = deque()
+        self.__batchHandlers = set()
+        self.__wakeup = threading.Event()
+        self.__running = False
+        self.__thread = None
+    
+    def post(self, handler, argsClass, args):
+        """Queues an event. Called from native callbacks; never blocks."""
+        if len(self.__queue) >= self.maxsize:
+            self.overflows += 1
+            return
+        self.__queue.append((handler, argsClass, args))
+        self.__wakeup.set()
+    
+    def deliverBatches(self, handler, enabled=True):
+        """Delivers events for this handler as a list of argument tuples instead of one EventArgs per event."""
+        if enabled:
+            self.__batchHandlers.add(handler)
+        else:
+            self.__batchHandlers.discard(handler)
+    
+    def drain(self, maxEvents=None):
+        """Delivers up to maxEvents (default batchSize) queued events on the calling thread. Returns the number delivered."""
+        if maxEvents is None:
+            maxEvents = self.batchSize
+        queue = self.__queue
+        depth = len(queue)
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+        
+        count = min(depth, maxEvents)
+        batchHandler = None
+        batch = []
+        for i in range(count):
+            handler, argsClass, args = queue.popleft()
+            if handler in self.__batchHandlers:
+                if handler is not batchHandler and batch:
+                    self.__deliver(batchHandler, batch, len(batch))
+                    batch = []
+                batchHandler = handler
+                batch.append(args)
+            else:
+                if batch:
+                    self.__deliver(batchHandler, batch, len(batch))
+                    batch = []
+                self.__deliver(handler, (argsClass, args), 1)
+        if batch:
+            self.__deliver(batchHandler, batch, len(batch))
+        
+        return count
+    
+    def __deliver(self, handler, argument, events):
+        #argument is a batch list, or (argsClass, args) for a single event
+        try:
+            if type(argument) is tuple:
+                argsClass, args = argument
+                handler(argsClass(*args))
+            else:
+                handler(argument)
+        except Exception as error:
+            self.failures += events
+            self.lastError = error
+            sys.stderr.write('Exception in Phidget event handler %s:\n' % (handler,))
+            traceback.print_exc()
+        else:
+            self.delivered += events
+    
+    def start(self):
+        """Starts a daemon consumer thread that delivers events as they arrive."""
+        if self.__thread is not None:
+            return
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__consume, name='PhidgetEventDispatcher')
+        self.__thread.daemon = True
+        self.__thread.start()
+    
+    def stop(self):
+        """Stops the consumer thread after delivering the events already queued."""
+        if self.__thread is None:
+            return
+        self.__running = False
+        self.__wakeup.set()
+        self.__thread.join()
+        self.__thread = None
+    
+    def getStats(self):
+        """Returns a dict with the queue length and the overflows, delivered, failures and maxDepth counters."""
+        return {'queued': len(self.__queue), 'overflows': self.overflows, 'delivered': self.delivered, 'failures': self.failures, 'maxDepth': self.maxDepth}
+    
+    def __consume(self):
+        while self.__running:
+            self.__wakeup.wait()
+            self.__wakeup.clear()
+            while self.drain():
+                pass
+        while self.drain():
+            pass
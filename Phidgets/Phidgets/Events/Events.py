@@ -247,6 +247,28 @@ class SpatialDataEventArgs:
         self.device = device
         self.spatialData = spatialDataCollection
 
+class SpatialDataBlockEventArgs:
+    """Spatial data for all samples of one spatial data event, as NumPy arrays.
+    
+    Row i of each array is sample i of the event. Axes that the board does not have, or that were not measured in a sample, are NaN.
+    Unless the event was queued through an EventDispatcher, the arrays are views into buffers that are reused by the next event, so copy them to keep them.
+    
+    Properties:
+        device<object>: Reference to the Phidget object from which this event originated
+        count<int>: Number of samples
+        timestamp<array>: Sample timestamps in seconds since the Phidget was opened, shape (count,)
+        acceleration<array>: Acceleration data (g), shape (count, 3)
+        angularRate<array>: Angular rate data (degrees/s), shape (count, 3)
+        magneticField<array>: Magnetic field data (Gauss), shape (count, 3)
+    """
+    def __init__(self, device, timestamp, acceleration, angularRate, magneticField):
+        self.device = device
+        self.count = len(timestamp)
+        self.timestamp = timestamp
+        self.acceleration = acceleration
+        self.angularRate = angularRate
+        self.magneticField = magneticField
+
 class StepperPositionChangeEventArgs:
     """Stepper Position Change Event data and information will be stored in this class.
     
@@ -268,6 +268,8 @@ class Phidget:
         self.__onServerConnect = None
         self.__onServerDisconnect = None
         
+        self.eventDispatcher = None
+        
         if sys.platform == 'win32':
             self.__ATTACHHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p)
             self.__DETACHHANDLER = WINFUNCTYPE(c_int, c_void_p, c_void_p)
@@ -632,9 +634,23 @@ class Phidget:
 
     def __nativeAttachEvent(self, handle, usrptr):
         if self.__attach != None:
-            self.__attach(AttachEventArgs(self))
+            if self.eventDispatcher != None:
+                self.eventDispatcher.post(self.__attach, AttachEventArgs, (self,))
+            else:
+                self.__attach(AttachEventArgs(self))
         return 0
 
+    def setEventDispatcher(self, dispatcher):
+        """Sets the EventDispatcher used to deliver this Phidget's events.
+        
+        With a dispatcher set, the native callbacks only queue the event data and return, and the handlers are called later by the dispatcher (see Phidgets.Events.Dispatcher).
+        This keeps slow handlers off the library's callback thread. Set to None to call handlers directly from the callback thread (the default).
+        
+        Parameters:
+            dispatcher<EventDispatcher>: the dispatcher to post events to, or None.
+        """
+        self.eventDispatcher = dispatcher
+
     def setOnAttachHandler(self, attachHandler):
         """Sets the Attach Event Handler.
         
@@ -666,7 +682,10 @@ class Phidget:
 
     def __nativeDetachEvent(self, handle, usrptr):
         if self.__detach != None:
-            self.__detach(DetachEventArgs(self))
+            if self.eventDispatcher != None:
+                self.eventDispatcher.post(self.__detach, DetachEventArgs, (self,))
+            else:
+                self.__detach(DetachEventArgs(self))
         return 0
 
     def setOnDetachHandler(self, detachHandler):
@@ -707,7 +726,10 @@ class Phidget:
         if self.__error != None:
             code = errorCode
             message = errorMessage
-            self.__error(ErrorEventArgs(self, message, code))
+            if self.eventDispatcher != None:
+                self.eventDispatcher.post(self.__error, ErrorEventArgs, (self, message, code))
+            else:
+                self.__error(ErrorEventArgs(self, message, code))
         return 0
 
     def setOnErrorhandler(self, errorHandler):
@@ -13,6 +13,24 @@ import sys
 
 class PhidgetLibrary:
     __dll = None
+    __functions = {}
+    
+    #typed prototypes (argtypes, restype) for frequently called functions
+    #set once when the library is loaded so ctypes does not infer argument conversions on every call
+    prototypes = {
+        'CPhidgetEncoder_getPosition': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetEncoder_getIndexPosition': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetEncoder_getEnabled': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetEncoder_getInputState': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetInterfaceKit_getInputState': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetInterfaceKit_getOutputState': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetInterfaceKit_getSensorValue': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetInterfaceKit_getSensorRawValue': ([c_void_p, c_int, POINTER(c_int)], c_int),
+        'CPhidgetSpatial_getAcceleration': ([c_void_p, c_int, POINTER(c_double)], c_int),
+        'CPhidgetSpatial_getAngularRate': ([c_void_p, c_int, POINTER(c_double)], c_int),
+        'CPhidgetSpatial_getMagneticField': ([c_void_p, c_int, POINTER(c_double)], c_int),
+    }
+    
     @staticmethod
     def getDll():
         if PhidgetLibrary.__dll is None:
@@ -24,5 +42,29 @@ class PhidgetLibrary:
                 PhidgetLibrary.__dll = cdll.LoadLibrary("libphidget21.so.0")
             else:
                 raise RuntimeError("Platform not supported")
+            PhidgetLibrary.__loadPrototypes()
         
-        return PhidgetLibrary.__dll
\ No newline at end of file
+        return PhidgetLibrary.__dll
+    
+    @staticmethod
+    def __loadPrototypes():
+        for name, (argtypes, restype) in PhidgetLibrary.prototypes.items():
+            function = getattr(PhidgetLibrary.__dll, name)
+            function.argtypes = argtypes
+            function.restype = restype
+            PhidgetLibrary.__functions[name] = function
+    
+    @staticmethod
+    def getFunction(name):
+        """Returns the library function with this name, typed if it has an entry in prototypes.
+        
+        Device classes look up their frequently called functions once and keep the returned callable.
+        
+        Exceptions:
+            RuntimeError - If current platform is not supported/phidget c dll cannot be found
+        """
+        function = PhidgetLibrary.__functions.get(name)
+        if function is None:
+            function = getattr(PhidgetLibrary.getDll(), name)
+            PhidgetLibrary.__functions[name] = function
+        return function
\ No newline at end of file
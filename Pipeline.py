@@ -0,0 +1,158 @@
+import multiprocessing
+import numpy
+import time
+
+import LoopScheduler
+
+class SeqlockBuffer:
+    """
+    Single-writer shared memory buffer of floats protected by a sequence counter (seqlock).
+
+    The writer makes the sequence odd, writes the values and makes it even again. Readers copy the values and retry if the sequence was odd or changed during the copy, so readers never block the writer and no data is pickled or sent through a pipe.
+
+    Must be created before the processes that use it are started.
+    """
+
+    def __init__(self, length):
+        self.length = int(length)
+        self.__sequence = multiprocessing.RawValue('L', 0)
+        self.__raw = multiprocessing.RawArray('d', self.length)
+        self.__values = None
+
+    def __view(self):
+        #numpy view is created lazily so it is built in the process that uses it
+        if self.__values is None:
+            self.__values = numpy.frombuffer(self.__raw, dtype = numpy.float64)
+        return self.__values
+
+    def write(self, values):
+        view = self.__view()
+        sequence = self.__sequence
+        sequence.value += 1
+        view[:] = values
+        sequence.value += 1
+
+    def read(self, out = None):
+        """Return (sequence, values). 'out' may be a preallocated array to copy into."""
+        view = self.__view()
+        if out is None:
+            out = numpy.empty(self.length)
+        sequence = self.__sequence
+        while True:
+            before = sequence.value
+            if before & 1:
+                continue
+            out[:] = view
+            if sequence.value == before:
+                return before, out
+
+    def getSequence(self):
+        return self.__sequence.value
+
+
+def sensingStage(sampleBuffer, stopEvent, makeEncoders, rate):
+    """Sample encoder velocities and counts at 'rate' Hz and publish [time, v0, ..., c0, ...] for the motors in the buffer layout."""
+    encoders = makeEncoders()
+    scheduler = LoopScheduler.LoopScheduler(rate)
+    sample = numpy.zeros(sampleBuffer.length)
+    nmotors = (sampleBuffer.length - 1)//2
+    while not stopEvent.is_set():
+        scheduler.wait()
+        velocities = encoders.getVelocities()
+        counts = encoders.returnCountArray()
+        sample[:1 + nmotors] = velocities[:1 + nmotors]
+        sample[1 + nmotors:] = counts[1:1 + nmotors]
+        sampleBuffer.write(sample)
+    return scheduler.getStats()
+
+
+def controlStage(sampleBuffer, commandBuffer, stopEvent, controller, rate):
+    """
+    Read the newest sample and publish [sample time, command time, throttle 0, ...] at 'rate' Hz.
+
+    'controller' takes the sample array and returns a sequence of throttles.
+    """
+    scheduler = LoopScheduler.LoopScheduler(rate)
+    sample = numpy.zeros(sampleBuffer.length)
+    command = numpy.zeros(commandBuffer.length)
+    last_sequence = None
+    while not stopEvent.is_set():
+        scheduler.wait()
+        sequence, sample = sampleBuffer.read(sample)
+        if sequence == 0 or sequence == last_sequence:
+            #no new measurement
+            continue
+        last_sequence = sequence
+        throttles = controller(sample)
+        command[0] = sample[0]
+        command[1] = time.time()
+        command[2:] = throttles
+        commandBuffer.write(command)
+    return scheduler.getStats()
+
+
+def actuationStage(commandBuffer, stopEvent, makeMotors, rate):
+    """Write the newest throttle commands to the motors at 'rate' Hz; motors are set to 0 on stop."""
+    motors = makeMotors()
+    scheduler = LoopScheduler.LoopScheduler(rate)
+    command = numpy.zeros(commandBuffer.length)
+    last_sequence = None
+    nmotors = commandBuffer.length - 2
+    try:
+        while not stopEvent.is_set():
+            scheduler.wait()
+            sequence, command = commandBuffer.read(command)
+            if sequence == 0 or sequence == last_sequence:
+                continue
+            last_sequence = sequence
+            motors.setPWMs(command[2:].tolist())
+    finally:
+        motors.setPWMs([0]*nmotors)
+        motors.close()
+    return scheduler.getStats()
+
+
+def _runStage(stage, args):
+    #child process entry point; KeyboardInterrupt is handled by the parent
+    try:
+        stats = stage(*args)
+    except KeyboardInterrupt:
+        return
+    print '{0} timing: {1}'.format(stage.__name__, stats)
+
+
+class Pipeline:
+    """
+    Runs sensing, control and actuation in separate processes so each stage can use its own core.
+
+    Stages exchange only the latest sample and command through SeqlockBuffers. Encoders and Motors are constructed inside their stage processes by the 'makeEncoders' and 'makeMotors' factories (hardware handles cannot be shared across processes).
+    """
+
+    def __init__(self, makeEncoders, makeMotors, controller, nmotors = 3, sensingRate = 1000, controlRate = 500, actuationRate = 500):
+        self.nmotors = int(nmotors)
+        self.sampleBuffer = SeqlockBuffer(1 + 2*self.nmotors) #[time, velocities, counts]
+        self.commandBuffer = SeqlockBuffer(2 + self.nmotors) #[sample time, command time, throttles]
+        self.stopEvent = multiprocessing.Event()
+
+        self.processes = [
+            multiprocessing.Process(target = _runStage, name = 'sensing', args = (sensingStage, (self.sampleBuffer, self.stopEvent, makeEncoders, sensingRate))),
+            multiprocessing.Process(target = _runStage, name = 'control', args = (controlStage, (self.sampleBuffer, self.commandBuffer, self.stopEvent, controller, controlRate))),
+            multiprocessing.Process(target = _runStage, name = 'actuation', args = (actuationStage, (self.commandBuffer, self.stopEvent, makeMotors, actuationRate)))
+            ]
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+
+    def stop(self, timeout = 5):
+        self.stopEvent.set()
+        for p in self.processes:
+            p.join(timeout)
+
+    def latestSample(self):
+        """Return the newest [time, velocities, counts] sample (readable from the parent process)."""
+        return self.sampleBuffer.read()[1]
+
+    def latestCommand(self):
+        """Return the newest [sample time, command time, throttles] command."""
+        return self.commandBuffer.read()[1]
@@ -0,0 +1,105 @@
+import time
+import numpy
+
+#highest resolution wall clock available (time.perf_counter is Python 3 only)
+clock = getattr(time, 'perf_counter', time.time)
+
+class StageProfiler:
+    """
+    Per-stage timing for the control loop iteration.
+
+    Call start() at the top of the iteration, mark(stage) when each stage finishes and end() once per iteration. The duration of a stage is the time since the previous mark (or start). Stages that were not marked in an iteration are stored as NaN.
+    mark() only stores a timestamp in a preallocated list; end() writes one row of a preallocated (history_length x stages) array. When disabled, start, mark, record and end are replaced by a no-op.
+    Stages that run outside the marked sequence (e.g. in another thread) are given a measured duration with record(stage, duration) instead of a mark.
+
+    Stage indices are looked up once with stage(name) so the hot path avoids string lookups.
+    """
+
+    default_stages = ['encoder_read', 'velocity_estimation', 'control_law', 'pwm_computation', 'i2c_write', 'logging']
+
+    def __init__(self, stages = None, history_length = 5*10**4, enabled = True):
+        self.stages = list(stages or self.default_stages)
+        self.history_length = int(history_length)
+        self.durations = numpy.zeros((self.history_length, len(self.stages)))
+        self.start_times = numpy.zeros(self.history_length)
+        self.index = 0 #number of iterations recorded
+        self.__times = [None]*len(self.stages)
+        self.__recorded = [None]*len(self.stages)
+        self.__start = 0.0
+        self.__nan = float('nan')
+
+        self.enabled = enabled
+        if not enabled:
+            self.start = self.mark = self.record = self.end = self.__noop
+
+    def __noop(self, *args):
+        pass
+
+    def stage(self, name):
+        """Return index of a stage for use with mark()."""
+        return self.stages.index(name)
+
+    def start(self):
+        self.__start = clock()
+
+    def mark(self, stage):
+        self.__times[stage] = clock()
+
+    def record(self, stage, duration):
+        self.__recorded[stage] = duration
+
+    def end(self):
+        times = self.__times
+        recorded = self.__recorded
+        i = self.index % self.history_length
+        row = self.durations[i]
+        previous = self.__start
+        for j, t in enumerate(times):
+            if recorded[j] is not None:
+                row[j] = recorded[j]
+                recorded[j] = None
+                times[j] = None
+            elif t is None:
+                row[j] = self.__nan
+            else:
+                row[j] = t - previous
+                previous = t
+                times[j] = None
+        self.start_times[i] = self.__start
+        self.index += 1
+
+    def getDurations(self):
+        """Return (start times, durations) for recorded iterations in chronological order."""
+        if self.index <= self.history_length:
+            return self.start_times[:self.index], self.durations[:self.index]
+        start = self.index % self.history_length
+        order = numpy.r_[start:self.history_length, 0:start]
+        return self.start_times[order], self.durations[order]
+
+    def getLog(self, asLists = False):
+        """Return durations as {'time': ..., stage: ...} for DataLog.updateLog({'stage_latency': ...})."""
+        start_times, durations = self.getDurations()
+        convert = (lambda x: x.tolist()) if asLists else numpy.ascontiguousarray
+        log = {'time': convert(start_times)}
+        for j, name in enumerate(self.stages):
+            log[name] = convert(durations[:, j])
+        return log
+
+    def report(self):
+        """Return a printable table of mean, p99 and max duration per stage in microseconds."""
+        start_times, durations = self.getDurations()
+        lines = ['{0:<22s}{1:>12s}{2:>12s}{3:>12s}{4:>8s}'.format('stage (us)', 'mean', 'p99', 'max', 'share')]
+        if not len(durations):
+            return lines[0]
+        #stages without samples yet (e.g. before the asynchronous writer reports) have no mean and are shown as '-'
+        samples = (~numpy.isnan(durations)).sum(axis = 0)
+        means = numpy.nansum(durations, axis = 0)/numpy.maximum(samples, 1)
+        total = means.sum()
+        for j, name in enumerate(self.stages):
+            column = durations[:, j]
+            column = column[~numpy.isnan(column)]
+            if not len(column):
+                lines.append('{0:<22s}{1:>12s}'.format(name, '-'))
+                continue
+            lines.append('{0:<22s}{1:>12.1f}{2:>12.1f}{3:>12.1f}{4:>7.1f}%'.format(name, means[j]*10**6, numpy.percentile(column, 99)*10**6, column.max()*10**6, 100*means[j]/total if total else 0.0))
+        return '\n'.join(lines)
@@ -0,0 +1,158 @@
+import numpy
+
+def expm(M, terms = 20):
+    """Matrix exponential by scaling and squaring of a truncated Taylor series (numpy only)."""
+    M = numpy.asarray(M, dtype = numpy.float64)
+    norm = numpy.abs(M).sum(axis = 1).max()
+    squarings = max(int(numpy.ceil(numpy.log2(norm))) + 1, 0) if norm > 0 else 0
+    M = M/2.0**squarings
+
+    result = numpy.eye(len(M))
+    term = numpy.eye(len(M))
+    for k in xrange(1, terms + 1):
+        term = term.dot(M)/k
+        result += term
+    for k in xrange(squarings):
+        result = result.dot(result)
+    return result
+
+
+def discretize(A, B, h):
+    """Zero-order hold discretization of continuous model dx/dt = Ax + Bu with timestep h. Returns (Ad, Bd)."""
+    A = numpy.atleast_2d(numpy.asarray(A, dtype = numpy.float64))
+    B = numpy.asarray(B, dtype = numpy.float64).reshape(len(A), -1)
+    n, m = B.shape
+
+    #exp([[A, B], [0, 0]]*h) = [[Ad, Bd], [0, I]]
+    M = numpy.zeros((n + m, n + m))
+    M[:n, :n] = A
+    M[:n, n:] = B
+    E = expm(M*h)
+    return E[:n, :n], E[:n, n:]
+
+
+def solveDARE(A, B, Q, R, tolerance = 10**(-10), max_iterations = 10**5):
+    """
+    Solve the discrete-time algebraic Riccati equation P = A'PA - A'PB (R + B'PB)^-1 B'PA + Q by fixed-point iteration.
+
+    Raises RuntimeError if the iteration does not converge (e.g. (A, B) not stabilizable).
+    """
+    A = numpy.asarray(A, dtype = numpy.float64)
+    B = numpy.asarray(B, dtype = numpy.float64)
+    Q = numpy.asarray(Q, dtype = numpy.float64)
+    R = numpy.asarray(R, dtype = numpy.float64)
+
+    P = Q.copy()
+    for i in xrange(max_iterations):
+        BP = B.T.dot(P)
+        P_next = A.T.dot(P).dot(A) - A.T.dot(P).dot(B).dot(numpy.linalg.solve(R + BP.dot(B), BP.dot(A))) + Q
+        P_next = (P_next + P_next.T)/2
+        if numpy.abs(P_next - P).max() <= tolerance*max(numpy.abs(P_next).max(), 1.0):
+            return P_next
+        P = P_next
+    raise RuntimeError('Riccati iteration did not converge in {0} iterations.'.format(max_iterations))
+
+
+def dlqr(A, B, Q, R):
+    """Return (K, P) of the discrete-time LQR u = -Kx minimizing sum(x'Qx + u'Ru)."""
+    B = numpy.asarray(B, dtype = numpy.float64)
+    R = numpy.asarray(R, dtype = numpy.float64)
+    P = solveDARE(A, B, Q, R)
+    K = numpy.linalg.solve(R + B.T.dot(P).dot(B), B.T.dot(P).dot(A))
+    return K, P
+
+
+class LQR:
+    """
+    State-feedback controller u = u0 - K (x - xsp) with gains precomputed offline for several operating points.
+
+    Each operating point is a linearization of the cube (A, B) around an equilibrium state x0 with input u0. fromModels solves the discrete LQR problem for each one; at run time returnOutput uses the operating point whose x0 is closest to the measured state, so each step costs a nearest-point search over a few points and one small matrix-vector product.
+
+    returnOutput has the same (set point, (t, measurement)) interface as PID.returnOutput, with state and input vectors in place of scalars. Outputs are clipped to [uMin, uMax] if given.
+    """
+
+    def __init__(self, gains, x0 = None, u0 = None, uMin = None, uMax = None):
+        """
+        gains: list of K matrices (inputs x states), one per operating point
+        x0, u0: lists of the equilibrium state and input of each operating point (zeros by default)
+        """
+        self.gains = numpy.array(gains, dtype = numpy.float64)
+        if self.gains.ndim == 2:
+            self.gains = self.gains[numpy.newaxis]
+        npoints, ninputs, nstates = self.gains.shape
+        self.ninputs = ninputs
+        self.nstates = nstates
+
+        self.x0 = numpy.zeros((npoints, nstates)) if x0 is None else numpy.array(x0, dtype = numpy.float64).reshape(npoints, nstates)
+        self.u0 = numpy.zeros((npoints, ninputs)) if u0 is None else numpy.array(u0, dtype = numpy.float64).reshape(npoints, ninputs)
+
+        self.uMin = -numpy.inf if uMin is None else numpy.asarray(uMin, dtype = numpy.float64)
+        self.uMax = numpy.inf if uMax is None else numpy.asarray(uMax, dtype = numpy.float64)
+
+        self.operating_point = None #index fixed with setOperatingPoint, or None to select by nearest x0
+        self.last_operating_point = 0
+        self.t_old = None
+
+    @classmethod
+    def fromModels(cls, models, Q, R, h = None, **kwargs):
+        """
+        Compute gains offline for a list of models.
+
+        models: list of dicts with 'A' and 'B' (and optionally 'x0', 'u0'). If h is given, A and B are continuous-time and are discretized with timestep h; otherwise they are already discrete.
+        """
+        gains = []
+        x0 = []
+        u0 = []
+        for model in models:
+            A, B = model['A'], model['B']
+            if h is not None:
+                A, B = discretize(A, B, h)
+            K, P = dlqr(A, B, Q, R)
+            gains.append(K)
+            x0.append(model.get('x0', numpy.zeros(K.shape[1])))
+            u0.append(model.get('u0', numpy.zeros(K.shape[0])))
+        return cls(gains, x0, u0, **kwargs)
+
+    def saveGains(self, filePath):
+        numpy.savez(filePath, gains = self.gains, x0 = self.x0, u0 = self.u0, uMin = self.uMin, uMax = self.uMax)
+
+    @classmethod
+    def loadGains(cls, filePath):
+        data = numpy.load(filePath)
+        return cls(data['gains'], data['x0'], data['u0'], data['uMin'], data['uMax'])
+
+    def setOperatingPoint(self, index = None):
+        """Use the gains of one operating point for every step, or None to select the nearest operating point each step."""
+        self.operating_point = index
+
+    def getParameters(self):
+        return {
+            'gains': self.gains.tolist(),
+            'x0': self.x0.tolist(),
+            'u0': self.u0.tolist(),
+            'uMin': numpy.asarray(self.uMin).tolist(),
+            'uMax': numpy.asarray(self.uMax).tolist()
+            }
+
+    def printParameters(self):
+        parameters = self.getParameters()
+        for i in parameters:
+            print '{0}: {1}'.format(i, parameters[i])
+
+    def returnOutput(self, xsp, measured_state):
+        """Take in commanded state and measured state (t, x). Return input vector."""
+        t, x = measured_state
+        x = numpy.asarray(x, dtype = numpy.float64)
+
+        i = self.operating_point
+        if i is None:
+            if len(self.x0) == 1:
+                i = 0
+            else:
+                d = self.x0 - x
+                i = int(numpy.einsum('ij,ij->i', d, d).argmin())
+        self.last_operating_point = i
+
+        u = self.u0[i] - self.gains[i].dot(x - xsp)
+        self.t_old = t
+        return numpy.clip(u, self.uMin, self.uMax)
@@ -0,0 +1,169 @@
+import numpy
+
+class RegressionVelocityEstimator:
+    """
+    Fixed-window least-squares velocity estimator.
+
+    Fits a line to the last 'window' (time, counts) samples of each channel and returns the slope in counts/s.
+    Running sums are updated in O(1) per sample and are recomputed from the window every 'window' samples to keep rounding error bounded.
+    """
+
+    def __init__(self, window = 16, nchannels = 3):
+        if window < 2:
+            raise RuntimeError('Regression window must contain at least 2 samples (provided {0}).'.format(window))
+
+        self.window = int(window)
+        self.nchannels = int(nchannels)
+
+        #preallocated sample history (absolute times and counts)
+        self.times = numpy.zeros(self.window)
+        self.counts = numpy.zeros((self.window, self.nchannels))
+        self.velocities = numpy.zeros(self.nchannels)
+
+        self.reset()
+
+    def reset(self):
+        self.n = 0 #number of valid samples in window
+        self.index = 0 #next write position in ring buffer
+        self.updates_since_rebase = 0
+        self.t0 = None #time reference for running sums
+
+        self.St = 0.0
+        self.Stt = 0.0
+        self.Sc = numpy.zeros(self.nchannels)
+        self.Stc = numpy.zeros(self.nchannels)
+        self.velocities[:] = 0.0
+
+    def update(self, t, counts):
+        """Add a sample (t in seconds, counts per channel) and return velocity estimates in counts/s."""
+        counts = numpy.asarray(counts, dtype = float)
+
+        if self.t0 is None:
+            self.t0 = t
+
+        if self.n == self.window:
+            #remove oldest sample from sums before it is overwritten
+            t_old = self.times[self.index] - self.t0
+            c_old = self.counts[self.index]
+            self.St -= t_old
+            self.Stt -= t_old*t_old
+            self.Sc -= c_old
+            self.Stc -= t_old*c_old
+        else:
+            self.n += 1
+
+        self.times[self.index] = t
+        self.counts[self.index] = counts
+        self.index = (self.index + 1) % self.window
+
+        tr = t - self.t0
+        self.St += tr
+        self.Stt += tr*tr
+        self.Sc += counts
+        self.Stc += tr*counts
+
+        self.updates_since_rebase += 1
+        if self.updates_since_rebase >= self.window:
+            self.__rebase(t)
+
+        if self.n < 2:
+            return self.velocities
+
+        denominator = self.n*self.Stt - self.St*self.St
+        if denominator <= 0:
+            return self.velocities
+
+        self.velocities[:] = (self.n*self.Stc - self.St*self.Sc)/denominator
+        return self.velocities
+
+    def __rebase(self, t):
+        #move time reference to newest sample and recompute sums exactly
+        self.t0 = t
+        self.updates_since_rebase = 0
+
+        if self.n == self.window:
+            times = self.times - t
+            counts = self.counts
+        else:
+            times = self.times[:self.n] - t
+            counts = self.counts[:self.n]
+
+        self.St = times.sum()
+        self.Stt = numpy.dot(times, times)
+        self.Sc[:] = counts.sum(axis = 0)
+        self.Stc[:] = numpy.dot(times, counts)
+
+
+class KalmanVelocityEstimator:
+    """
+    Constant-acceleration Kalman filter velocity estimator.
+
+    State per channel is [position, velocity, acceleration] in counts. Measurement is the encoder count with quantization variance of 1/12 counts^2.
+    All channels share one timestep, so a single 3x3 covariance is propagated and every channel is updated in one vectorized step.
+
+    'q' is the spectral density of the jerk process noise (counts^2/s^5). Larger values track faster but pass more quantization noise.
+    """
+
+    def __init__(self, q = 10.0**6, r = 1/12.0, nchannels = 3):
+        self.q = float(q)
+        self.r = float(r)
+        self.nchannels = int(nchannels)
+
+        #preallocated state and work arrays
+        self.x = numpy.zeros((3, self.nchannels))
+        self.P = numpy.zeros((3, 3))
+        self.F = numpy.eye(3)
+        self.Q = numpy.zeros((3, 3))
+        self.K = numpy.zeros(3)
+
+        self.reset()
+
+    def reset(self):
+        self.t_old = None
+        self.x[:] = 0.0
+        self.P[:] = 0.0
+        self.P[0, 0] = self.r
+        self.P[1, 1] = 10.0**8
+        self.P[2, 2] = 10.0**8
+
+    def update(self, t, counts):
+        """Add a sample (t in seconds, counts per channel) and return velocity estimates in counts/s."""
+        counts = numpy.asarray(counts, dtype = float)
+
+        if self.t_old is None:
+            self.t_old = t
+            self.x[0] = counts
+            return self.x[1]
+
+        h = t - self.t_old
+        self.t_old = t
+        if h <= 0:
+            return self.x[1]
+
+        #predict
+        F = self.F
+        F[0, 1] = h
+        F[0, 2] = 0.5*h*h
+        F[1, 2] = h
+
+        h2 = h*h
+        h3 = h2*h
+        Q = self.Q
+        Q[0, 0] = h2*h3/20.0
+        Q[0, 1] = Q[1, 0] = h2*h2/8.0
+        Q[0, 2] = Q[2, 0] = h3/6.0
+        Q[1, 1] = h3/3.0
+        Q[1, 2] = Q[2, 1] = h2/2.0
+        Q[2, 2] = h
+        Q *= self.q
+
+        self.x[:] = numpy.dot(F, self.x)
+        self.P[:] = numpy.dot(numpy.dot(F, self.P), F.T) + Q
+
+        #correct (H = [1, 0, 0])
+        self.K[:] = self.P[:, 0]/(self.P[0, 0] + self.r)
+        innovation = counts - self.x[0]
+        self.x += numpy.outer(self.K, innovation)
+        self.P -= numpy.outer(self.K, self.P[0])
+
+        return self.x[1]
@@ -0,0 +1,221 @@
+import DataLog, PID
+import argparse, itertools, multiprocessing, numpy
+
+"""
+Offline PID autotuner that replays recorded DataLog runs (.json or columnar .cols).
+
+For every wheel:
+	commanded_throttle and measured_velocity are resampled to a uniform timestep
+	a first-order-plus-dead-time (FOPDT) model y[k+1] = a*y[k] + b*u[k-d] + c is fit by least squares, solved for all candidate delays d at once
+	the model gives Kp (velocity per throttle percent), time constant tau and dead time theta
+	a grid of K, Ti, Td around the SIMC tuning of the model is simulated against the discrete model (step in set point, saturating throttle), with candidates split into chunks evaluated in a process pool and each chunk simulated as one PID.PIDArray (same discrete update as PID.PID)
+	candidates are ranked by integrated absolute error, and overshoot and settling time are reported
+	the set point weight b and anti-windup time constant Tt that were simulated are reported with K, Ti, Td: the same response is obtained with PID.PID(K, Ti, Td, h, antiWindupDict = {'Tt': Tt, 'actuatorModel': throttle saturation}, setPointWeightingDict = {'b': b})
+	PID gains must be non-negative, so a wheel whose velocity falls with throttle (Kp < 0) is tuned with the throttle sign flipped and reported with direction -1: throttle = direction*PID output
+
+usage: python autotune.py log1 [log2 ...] [-s stepSize] [-b setPointWeight] [-n top] [-o output.csv] [-p processes]
+"""
+
+throttle_limits = (-100.0, 100.0)
+
+def resample(data, wheel, h = None):
+	"""Return (h, u, y): throttle (zero-order hold) and measured velocity of one wheel on a uniform time grid."""
+	throttle = data['commanded_throttle']
+	velocity = data['measured_velocity']
+	t_u = numpy.asarray(throttle['time'], dtype = float)
+	t_y = numpy.asarray(velocity['time'], dtype = float)
+	if len(t_u) < 2 or len(t_y) < 2:
+		raise RuntimeError('Log does not contain commanded_throttle and measured_velocity series for wheel {0}.'.format(wheel))
+
+	if h is None:
+		h = float(numpy.median(numpy.diff(t_y)))
+	t = numpy.arange(max(t_u[0], t_y[0]), min(t_u[-1], t_y[-1]), h)
+
+	u = numpy.asarray(throttle[wheel], dtype = float)[numpy.clip(numpy.searchsorted(t_u, t, side = 'right') - 1, 0, len(t_u) - 1)]
+	y = numpy.interp(t, t_y, numpy.asarray(velocity[wheel], dtype = float))
+	return h, u, y
+
+def fitFOPDT(u, y, h, max_delay = 50):
+	"""
+	Fit y[k+1] = a*y[k] + b*u[k-d] + c for every delay d in 0..max_delay (samples) and keep the best.
+
+	The normal equations for all delays are built with array operations and solved as one batch. Returns dict with Kp, tau, theta (s), the discrete coefficients and the residual RMS.
+	"""
+	n = len(y)
+	if numpy.ptp(u) == 0:
+		raise RuntimeError('Throttle is constant ({0}) over the run, so the wheel gain cannot be identified. Use a run with a throttle step.'.format(u[0]))
+	max_delay = int(min(max_delay, n//4))
+	m = n - 1 - max_delay
+	if m < 10:
+		raise RuntimeError('Not enough samples ({0}) to fit a model.'.format(n))
+
+	y0 = y[max_delay:n - 1] #y[k]
+	y1 = y[max_delay + 1:n] #y[k+1]
+	delays = numpy.arange(max_delay + 1)
+	U = numpy.array([u[max_delay - d:n - 1 - d] for d in delays]) #u[k-d] for each delay
+
+	#regressors [y[k], u[k-d], 1] for every delay: shape (delays, m, 3)
+	X = numpy.empty((len(delays), m, 3))
+	X[:, :, 0] = y0
+	X[:, :, 1] = U
+	X[:, :, 2] = 1.0
+	XtX = numpy.einsum('dki,dkj->dij', X, X)
+	Xty = numpy.einsum('dki,k->di', X, y1)
+	#small ridge term keeps the solve defined for constant inputs
+	XtX += 10**(-9)*numpy.trace(XtX, axis1 = 1, axis2 = 2)[:, None, None]*numpy.eye(3)
+	beta = numpy.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+
+	residuals = ((y1[None, :] - numpy.einsum('dki,di->dk', X, beta))**2).mean(axis = 1)
+	d = int(residuals.argmin())
+	a, b, c = beta[d]
+	if not 0 < a < 1:
+		raise RuntimeError('Fitted model is not a stable first order system (a = {0}). The run may not excite the wheel enough.'.format(a))
+
+	return {
+		'Kp': b/(1 - a),
+		'tau': -h/numpy.log(a),
+		'theta': d*h,
+		'a': a,
+		'b': b,
+		'c': c,
+		'delay': d,
+		'h': h,
+		'rms': numpy.sqrt(residuals[d])
+		}
+
+def candidateGrid(model, npoints = 16, spread = 4.0):
+	"""Return list of (K, Ti, Td) spaced logarithmically around the SIMC tuning of the model (Td = 0 included)."""
+	Kp, tau, theta = model['Kp'], model['tau'], max(model['theta'], model['h'])
+	#SIMC PI tuning with closed loop time constant equal to the dead time
+	K0 = tau/(abs(Kp)*2*theta)
+	Ti0 = min(tau, 8*theta)
+	Td0 = theta/2
+
+	factors = numpy.logspace(-numpy.log10(spread), numpy.log10(spread), npoints)
+	Ks = K0*factors
+	Tis = Ti0*factors
+	Tds = numpy.concatenate(([0.0], Td0*factors[::max(npoints//4, 1)]))
+	return list(itertools.product(Ks, Tis, Tds))
+
+def simulateCandidates(args):
+	"""Simulate a set point step for a chunk of (K, Ti, Td) candidates at once. Returns array of (IAE, overshoot %, settling time) rows."""
+	model, candidates, step, duration, b_weight = args
+	a, d, h = model['a'], model['delay'], model['h']
+	#PID gains are non-negative, so a wheel with negative gain is simulated with the throttle sign flipped (see direction in tuneWheel)
+	b = abs(model['b'])
+	K, Ti, Td = numpy.array(candidates, dtype = float).T
+	ncandidates = len(K)
+
+	controller = PID.PIDArray(K, Ti = Ti, Td = Td, h = h, b = b_weight, Tt = antiWindupTime(Ti, Td), uMin = throttle_limits[0], uMax = throttle_limits[1], naxes = ncandidates)
+	nsteps = int(duration/h)
+	y = numpy.zeros(ncandidates)
+	ysp = numpy.repeat(float(step), ncandidates)
+	delayed = numpy.zeros((d + 1, ncandidates)) #ring buffer of past throttle commands
+	response = numpy.empty((nsteps, ncandidates))
+
+	for k in xrange(nsteps):
+		u = controller.returnOutput(ysp, (k*h, y))
+		delayed[k % (d + 1)] = u
+		#deviation model around the fitted operating point (offset c excluded)
+		y = a*y + b*delayed[(k + 1) % (d + 1)]
+		response[k] = y
+
+	with numpy.errstate(invalid = 'ignore', over = 'ignore'):
+		error = numpy.abs(response - step)
+		iae = error.sum(axis = 0)*h
+		#overshoot in the direction of the step
+		overshoot = numpy.maximum((response*numpy.sign(step)).max(axis = 0) - abs(step), 0)/abs(step)*100
+		outside = error > 0.02*abs(step)
+	#settling time: last time outside the 2% band (inf if still outside at the end)
+	last = nsteps - 1 - numpy.argmax(outside[::-1], axis = 0)
+	settling = numpy.where(outside.any(axis = 0), (last + 1)*h, 0.0)
+	settling[outside[-1]] = numpy.inf
+	iae[~numpy.isfinite(iae)] = numpy.inf
+	return numpy.column_stack((iae, overshoot, settling))
+
+def antiWindupTime(Ti, Td):
+	"""Anti-windup time constant used for candidates: sqrt(Ti*Td) (rule of thumb in Astrom), or Ti without a derivative term."""
+	Ti = numpy.asarray(Ti, dtype = float)
+	Td = numpy.asarray(Td, dtype = float)
+	return numpy.where(Td > 0, numpy.sqrt(Ti*Td), Ti)
+
+def tuneWheel(model, step, duration = None, pool = None, chunk_length = 256, b = 0.0):
+	"""
+	Return candidates ranked by IAE as list of dicts (K, Ti, Td, Tt, b, direction, iae, overshoot, settling_time).
+
+	b is the set point weight simulated (0 is the PID.PID default). direction is the sign of Kp; the controller output must be multiplied by it.
+	"""
+	if step == 0:
+		raise RuntimeError('Set point step must be nonzero.')
+	if duration is None:
+		duration = 10*(model['tau'] + model['theta'])
+	candidates = candidateGrid(model)
+	chunks = [(model, candidates[i:i + chunk_length], step, duration, b) for i in xrange(0, len(candidates), chunk_length)]
+	results = numpy.vstack((pool.map if pool else map)(simulateCandidates, chunks))
+
+	direction = 1 if model['Kp'] >= 0 else -1
+	ranked = []
+	for i in numpy.argsort(results[:, 0]):
+		iae, overshoot, settling = results[i]
+		if not numpy.isfinite(iae):
+			continue
+		K, Ti, Td = candidates[i]
+		ranked.append({'K': K, 'Ti': Ti, 'Td': Td if Td > 0 else None, 'Tt': float(antiWindupTime(Ti, Td)), 'b': b, 'direction': direction, 'iae': iae, 'overshoot': overshoot, 'settling_time': settling})
+	return ranked
+
+def tuneLog(filePath, step = None, top = 5, pool = None, b = 0.0):
+	"""Fit and tune every wheel of a log. Returns {wheel: (model, ranked candidates)}."""
+	data = DataLog.DataLog().openLog(filePath)
+	results = {}
+	for wheel in xrange(3):
+		h, u, y = resample(data, wheel)
+		model = fitFOPDT(u, y, h)
+		wheel_step = step if step is not None else 0.5*numpy.abs(y).max()
+		if wheel_step == 0:
+			raise RuntimeError('Wheel {0} never moves in {1}, so no set point step can be chosen. Pass a nonzero step.'.format(wheel, filePath))
+		results[wheel] = (model, tuneWheel(model, wheel_step, pool = pool, b = b)[:top])
+	return results
+
+def printResults(filePath, results):
+	print filePath
+	for wheel in sorted(results):
+		model, ranked = results[wheel]
+		print '  wheel {0}: Kp = {1:.4g}, tau = {2:.4g} s, theta = {3:.4g} s (fit RMS {4:.3g})'.format(wheel, model['Kp'], model['tau'], model['theta'], model['rms'])
+		if model['Kp'] < 0:
+			print '    negative gain: velocity falls with throttle, so reverse the throttle sign (throttle = -PID output)'
+		print '    {0:>4s}{1:>12s}{2:>12s}{3:>12s}{4:>12s}{5:>6s}{6:>12s}{7:>14s}{8:>14s}'.format('rank', 'K', 'Ti', 'Td', 'Tt', 'b', 'IAE', 'overshoot %', 'settling (s)')
+		for rank, c in enumerate(ranked):
+			print '    {0:>4d}{1:>12.4g}{2:>12.4g}{3:>12s}{4:>12.4g}{5:>6.3g}{6:>12.4g}{7:>14.2f}{8:>14.3f}'.format(rank + 1, c['K'], c['Ti'], '{0:.4g}'.format(c['Td']) if c['Td'] else '-', c['Tt'], c['b'], c['iae'], c['overshoot'], c['settling_time'])
+
+def writeResults(allResults, filePath):
+	columns = ['log', 'wheel', 'rank', 'Kp', 'tau', 'theta', 'K', 'Ti', 'Td', 'Tt', 'b', 'direction', 'iae', 'overshoot', 'settling_time']
+	with open(filePath, 'w') as f:
+		f.write(','.join(columns) + '\n')
+		for log, results in allResults:
+			for wheel in sorted(results):
+				model, ranked = results[wheel]
+				for rank, c in enumerate(ranked):
+					row = [log, wheel, rank + 1, model['Kp'], model['tau'], model['theta'], c['K'], c['Ti'], c['Td'], c['Tt'], c['b'], c['direction'], c['iae'], c['overshoot'], c['settling_time']]
+					f.write(','.join(str(x) for x in row) + '\n')
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Fit FOPDT wheel models from DataLog runs and rank PID gains by simulated step response.')
+	parser.add_argument('logs', nargs = '+')
+	parser.add_argument('-s', '--step', type = float, default = None, help = 'set point step in log velocity units; defaults to half the largest measured velocity')
+	parser.add_argument('-b', '--setpoint-weight', type = float, default = 0.0, help = 'set point weight b of the proportional term (PID.PID default 0)')
+	parser.add_argument('-n', '--top', type = int, default = 5, help = 'number of gain sets reported per wheel')
+	parser.add_argument('-o', '--output', default = None, help = 'write ranked gains to a csv file')
+	parser.add_argument('-p', '--processes', type = int, default = None, help = 'defaults to number of CPUs')
+	args = parser.parse_args()
+
+	pool = multiprocessing.Pool(args.processes)
+	allResults = []
+	for log in args.logs:
+		results = tuneLog(log, args.step, args.top, pool, args.setpoint_weight)
+		printResults(log, results)
+		allResults.append((log, results))
+	pool.close()
+	pool.join()
+
+	if args.output:
+		writeResults(allResults, args.output)
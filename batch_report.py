@@ -0,0 +1,99 @@
+import matplotlib
+matplotlib.use('Agg') #headless backend; must be selected before pyplot is imported
+import matplotlib.pyplot as plt
+import DataLog, graphical_analysis
+import argparse, multiprocessing, os, glob, numpy
+
+"""
+Headless batch report for a directory of DataLog files (.json or columnar .cols).
+
+For every log, the graphical_analysis figures are rendered to image files and a summary row is computed:
+	tracking RMS error per wheel (measured velocity vs commanded velocity interpolated to measurement times)
+	latency percentiles for each logged latency
+	average loop rate
+Logs are processed in parallel with a process pool. The summary table is printed and written to summary.csv in the output directory.
+
+usage: python batch_report.py logDir [-o outputDir] [-f png svg] [-p processes]
+"""
+
+latency_names = ['iteration_latency', 'command_latency', 'measurement_to_command_latency']
+latency_percentiles = [50, 90, 99, 99.9]
+
+def summarizeLog(data):
+	summary = {}
+
+	vel_command = data['commanded_velocity']
+	vel_meas = data['measured_velocity']
+	for i in xrange(3):
+		measured = numpy.asarray(vel_meas[i], dtype = float)
+		commanded = numpy.interp(vel_meas['time'], vel_command['time'], vel_command[i]) if len(vel_command['time']) else numpy.nan
+		summary['rms_error_{0}'.format(i)] = numpy.sqrt(numpy.mean((measured - commanded)**2)) if len(measured) else numpy.nan
+
+	for name in latency_names:
+		latency = numpy.asarray(data[name], dtype = float)
+		if not len(latency):
+			latency = numpy.array([numpy.nan])
+		for p, value in zip(latency_percentiles, numpy.percentile(latency, latency_percentiles)):
+			summary['{0}_p{1}'.format(name, p)] = value
+		summary['{0}_max'.format(name)] = latency.max()
+
+	t = numpy.asarray(data['counts']['time'], dtype = float)
+	summary['loop_rate'] = (len(t) - 1)/(t[-1] - t[0]) if len(t) > 1 and t[-1] > t[0] else numpy.nan
+	summary['samples'] = len(t)
+	return summary
+
+def processLog(args):
+	filePath, outputDir, formats = args
+	baseName = os.path.splitext(os.path.basename(filePath))[0]
+	data = DataLog.DataLog().openLog(filePath)
+
+	for name, plot in graphical_analysis.figures:
+		fig = plot(data)
+		if fig is None:
+			continue
+		for fmt in formats:
+			fig.savefig(os.path.join(outputDir, '{0}_{1}.{2}'.format(baseName, name, fmt)))
+		plt.close(fig)
+
+	summary = summarizeLog(data)
+	summary['run'] = baseName
+	return summary
+
+def writeSummary(summaries, filePath):
+	columns = ['run', 'samples', 'loop_rate'] + ['rms_error_{0}'.format(i) for i in xrange(3)]
+	for name in latency_names:
+		columns += ['{0}_p{1}'.format(name, p) for p in latency_percentiles] + ['{0}_max'.format(name)]
+
+	with open(filePath, 'w') as f:
+		f.write(','.join(columns) + '\n')
+		for summary in summaries:
+			f.write(','.join(str(summary[c]) for c in columns) + '\n')
+
+	for summary in summaries:
+		print '{0}: {1} samples at {2:.1f} Hz, RMS error {3}, iteration latency p99 {4:.2f} ms'.format(
+			summary['run'], summary['samples'], summary['loop_rate'],
+			', '.join('{0:.3f}'.format(summary['rms_error_{0}'.format(i)]) for i in xrange(3)),
+			summary['iteration_latency_p99']*1000)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'Render figures and summary statistics for a directory of DataLog files.')
+	parser.add_argument('logDir')
+	parser.add_argument('-o', '--outputDir', default = None, help = 'defaults to <logDir>/report')
+	parser.add_argument('-f', '--formats', nargs = '+', default = ['png'], choices = ['png', 'svg'])
+	parser.add_argument('-p', '--processes', type = int, default = None, help = 'defaults to number of CPUs')
+	args = parser.parse_args()
+
+	outputDir = args.outputDir or os.path.join(args.logDir, 'report')
+	if not os.path.isdir(outputDir):
+		os.makedirs(outputDir)
+
+	logs = sorted(glob.glob(os.path.join(args.logDir, '*.json')) + glob.glob(os.path.join(args.logDir, '*.cols')))
+	if not logs:
+		raise RuntimeError('No .json or .cols logs found in {0}'.format(args.logDir))
+
+	pool = multiprocessing.Pool(args.processes)
+	summaries = pool.map(processLog, [(log, outputDir, args.formats) for log in logs])
+	pool.close()
+	pool.join()
+
+	writeSummary(summaries, os.path.join(outputDir, 'summary.csv'))
@@ -0,0 +1,10 @@
+import DataLog, sys
+
+#convert json logs to the memory-mapped columnar format read by DataLog.openLog
+#usage: python convert_log.py log1.json [log2.json ...]
+
+dataLog = DataLog.DataLog()
+
+for fileName in sys.argv[1:]:
+	columnarPath = dataLog.convertLog(fileName)
+	print '{0} -> {1}'.format(fileName, columnarPath)
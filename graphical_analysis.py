@@ -1,13 +1,10 @@
-import DataLog, sys, numpy, matplotlib
-matplotlib.use('GTKAgg')
+import DataLog, Decimation, sys, numpy, matplotlib
+if __name__ == '__main__':
+	#interactive backend only when run as a script; batch_report.py selects a headless backend
+	matplotlib.use('GTKAgg')
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 
-dataLog = DataLog.DataLog()
-fileName = str(sys.argv[1])
-
-data = dataLog.openLog(fileName)
-
 """
 graphs:
 1) Velocities:
@@ -20,52 +17,97 @@ graphs:
 3) Torque versus Time
 	dv/dt*J
 4) Counts versus Time
+
+All series are drawn through Decimation.DecimatedLine, which plots about two points per pixel
+(keeping each bucket's min and max) and re-decimates when the x axis is zoomed or panned.
 """
 
-velocity_units = data['velocity_units']
-vel_command = data['commanded_velocity']
-vel_meas = data['measured_velocity']
-comm_latency = data['command_latency']
-meas2comm_latency = data['measurement_to_command_latency']
-iter_latency = data['iteration_latency']
-counts = data['counts']
-
-#commanded velocities and measured velocities vs time
-for i in xrange(3):
-	plt.subplot(int('31'+str(i+1)))
-
-	#plot commanded velocities
-	plt.plot(vel_command['time'], vel_command[i],'b-', label =  'Commanded')
-
-	#plot measured velocities
-	plt.plot(vel_meas['time'], vel_meas[i], 'g-', label =  'Measured')
-
-	plt.title('Encoder {0}'.format(i))
-	plt.ylabel('Velocity ({0})'.format(velocity_units))
-	plt.legend()
-plt.xlabel('Timestamp (s)')
-plt.suptitle('Encoder Velocity ({0}) vs Time'.format(velocity_units))
-
-#plot loop latencies
-plt.figure()
-plt.plot(comm_latency, label = 'Command Latency')
-plt.plot(meas2comm_latency, label = 'Measurement to Command Latency')
-plt.plot(iter_latency,label = 'Iteration Latency')
-plt.title('Loop Latencies')
-plt.ylabel('Latency (s)')
-plt.xlabel('Sample')
-plt.legend()
-
-#plot counts for each axis
-plt.figure()
-lines = []
-for i in xrange(3):
-	plt.plot(counts['time'], counts[i], label = 'Encoder {0} Counts'.format(i))
-plt.title('Counts vs Time')
-plt.legend()
-plt.xlabel('Timestamp (s)')
-plt.ylabel('Counts')
-
-plt.show()
+def plotVelocities(data):
+	#commanded velocities and measured velocities vs time
+	velocity_units = data['velocity_units']
+	vel_command = data['commanded_velocity']
+	vel_meas = data['measured_velocity']
+
+	fig = plt.figure()
+	for i in xrange(3):
+		ax = fig.add_subplot(int('31'+str(i+1)))
+
+		#plot commanded velocities
+		Decimation.DecimatedLine(ax, vel_command['time'], vel_command[i],'b-', label =  'Commanded')
+
+		#plot measured velocities
+		Decimation.DecimatedLine(ax, vel_meas['time'], vel_meas[i], 'g-', label =  'Measured')
+
+		ax.set_title('Encoder {0}'.format(i))
+		ax.set_ylabel('Velocity ({0})'.format(velocity_units))
+		ax.legend()
+	ax.set_xlabel('Timestamp (s)')
+	fig.suptitle('Encoder Velocity ({0}) vs Time'.format(velocity_units))
+	return fig
+
+def plotLatencies(data):
+	#plot loop latencies
+	comm_latency = data['command_latency']
+	meas2comm_latency = data['measurement_to_command_latency']
+	iter_latency = data['iteration_latency']
+
+	fig = plt.figure()
+	ax = fig.add_subplot(111)
+	Decimation.DecimatedLine(ax, numpy.arange(len(comm_latency)), comm_latency, label = 'Command Latency')
+	Decimation.DecimatedLine(ax, numpy.arange(len(meas2comm_latency)), meas2comm_latency, label = 'Measurement to Command Latency')
+	Decimation.DecimatedLine(ax, numpy.arange(len(iter_latency)), iter_latency, label = 'Iteration Latency')
+	ax.set_title('Loop Latencies')
+	ax.set_ylabel('Latency (s)')
+	ax.set_xlabel('Sample')
+	ax.legend()
+	return fig
+
+def plotCounts(data):
+	#plot counts for each axis
+	counts = data['counts']
+
+	fig = plt.figure()
+	ax = fig.add_subplot(111)
+	for i in xrange(3):
+		Decimation.DecimatedLine(ax, counts['time'], counts[i], label = 'Encoder {0} Counts'.format(i))
+	ax.set_title('Counts vs Time')
+	ax.legend()
+	ax.set_xlabel('Timestamp (s)')
+	ax.set_ylabel('Counts')
+	return fig
+
+def plotStageLatencies(data):
+	#plot per-stage durations recorded by StageProfiler, if present in the log
+	stage_latency = data.get('stage_latency')
+	if not stage_latency:
+		return None
+
+	fig = plt.figure()
+	ax = fig.add_subplot(111)
+	for name in sorted(k for k in stage_latency if k != 'time'):
+		Decimation.DecimatedLine(ax, numpy.arange(len(stage_latency[name])), stage_latency[name], label = name)
+	ax.set_title('Stage Latencies')
+	ax.set_ylabel('Duration (s)')
+	ax.set_xlabel('Iteration')
+	ax.legend()
+	return fig
+
+#figure name and plotting function for each figure produced from a log
+#plotting functions return None when the log does not contain the required data
+figures = [
+	('velocities', plotVelocities),
+	('latencies', plotLatencies),
+	('counts', plotCounts),
+	('stages', plotStageLatencies)
+	]
+
+if __name__ == '__main__':
+	dataLog = DataLog.DataLog()
+	fileName = str(sys.argv[1])
+
+	data = dataLog.openLog(fileName)
 
+	for name, plot in figures:
+		plot(data)
 
+	plt.show()
@@ -1,4 +1,5 @@
 import Motors
+import LoopScheduler
 import math
 import time
 
@@ -9,6 +10,8 @@ max_throttle_percentage = 100
 min_throttle_pulse_width = 1100 #in microseconds
 max_throttle_pulse_width = 1940 #in microseconds
 PWM_frequency = 500 #in Hz
+loop_rate = 500 #in Hz, used when driving motors in a wave
+drive_wave = False #toggle to True to drive motors in a wave instead of holding 50% throttle
 
 #instantiate motor group object
 motors = Motors.Motors(i2c_bus_num,nmotors,min_throttle_percentage, max_throttle_percentage, min_throttle_pulse_width, max_throttle_pulse_width)
@@ -26,18 +29,21 @@ if __name__ == "__main__":
             print 'PWM Num = {0}'.format(pwmNum)
             motors.setPWM(pwmNum,50)
 
-        while True:
-            time.sleep(1)
-        #drive motors in wave
-        """
+        if not drive_wave:
+            while True:
+                time.sleep(1)
+
+        #drive motors in wave at a fixed rate
         pi = 3.14159
         freq = 1.0 #wave frequency in radians/s
-        while True:
-            for pwmNum in xrange(nmotors):
-                print 'PWM Num = {0}'.format(pwmNum)
-                motors.setPWM(pwmNum,wave(100, 2*pi/nmotors*pwmNum, freq, time.time()))
-        """
+        scheduler = LoopScheduler.LoopScheduler(loop_rate)
+        def step():
+            t = time.time()
+            motors.setPWMs([wave(100, 2*pi/nmotors*pwmNum, freq, t) for pwmNum in xrange(nmotors)])
+        scheduler.run(step)
     except KeyboardInterrupt:
         print "Interrupt Detected"
+        if drive_wave:
+            scheduler.printStats()
         for i in xrange(nmotors):
             motors.setPWM(i,0)
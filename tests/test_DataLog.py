@@ -0,0 +1,32 @@
+import os, shutil, sys, tempfile, unittest
+import numpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import DataLog, PID
+
+class ColumnarDataLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stream_with_PID_parameters(self):
+        #PID parameters contain lambdas, as set by Closed_Loop_Test before starting the stream
+        log = DataLog.ColumnarDataLog(logDir = self.directory, buffer_length = 100)
+        log.updateLog({'PID_parameters': PID.PID(1.0, Ti = 0.2).getParameters(), 'velocity_units': 'rad/s'})
+        filePath = os.path.join(self.directory, 'stream.bin')
+        log.startStream(filePath, chunk_length = 10)
+        for k in xrange(25):
+            log.record(k*0.01, k*0.01, [k, k, k], k*0.01, numpy.zeros(3), numpy.zeros(3), k*0.01, numpy.zeros(3), 0.01, 0.001, 0.002)
+        log.stopStream()
+
+        metadata, records = log.openStreamLog(filePath)
+        self.assertEqual(metadata['PID_parameters']['K'], 1.0)
+        self.assertEqual(metadata['velocity_units'], 'rad/s')
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records['counts'][-1, 0], 24)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import gc, os, sys, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy
+
+import Decimation
+
+class DecimatedLineTest(unittest.TestCase):
+
+    def test_zoom_redecimates_without_reference(self):
+        fig = plt.figure()
+        ax = fig.add_subplot(111)
+        x = numpy.arange(10**5, dtype = float)
+        y = numpy.sin(x/100.0)
+        Decimation.DecimatedLine(ax, x, y) #instance is not kept by the caller
+        gc.collect()
+
+        line = ax.lines[0]
+        full = len(line.get_xdata())
+        self.assertLess(full, 5000)
+
+        ax.set_xlim(1000, 1500)
+        zoomed = line.get_xdata()
+        #every sample in the zoomed window is shown, and nothing far outside it
+        self.assertGreaterEqual(len(zoomed), 500)
+        self.assertLess(len(zoomed), 510)
+        self.assertGreaterEqual(zoomed.min(), 998)
+        plt.close(fig)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os, sys, time, unittest
+import numpy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import PID
+
+class PIDTest(unittest.TestCase):
+
+	def test_first_sample_with_absolute_time(self):
+		#the first call only latches time; an epoch timestamp must not be used as a timestep
+		controller = PID.PID(2.0, Ti = 0.2, Td = 0.01)
+		t = time.time()
+		controller.returnOutput(1.0, (t, 0.0))
+		self.assertEqual(controller.I, 0)
+		u = controller.returnOutput(1.0, (t + 0.002, 0.0))
+		self.assertAlmostEqual(controller.I, 2.0*0.002/0.2)
+		self.assertLess(abs(u), 10)
+
+	def test_coefficient_cache_is_bounded(self):
+		controller = PID.PID(2.0, Ti = 0.2, Td = 0.01, cacheLength = 4)
+		t = 1000.0
+		for k in xrange(100):
+			controller.returnOutput(1.0, (t, 0.0))
+			t += 0.002 + k*10**(-6)
+		self.assertEqual(len(controller._PID__coefficientCache), 4)
+
+	def test_full_cache_uses_measured_timestep(self):
+		controller = PID.PID(2.0, Ti = 0.2, Td = 0.01, cacheLength = 1)
+		controller.returnOutput(1.0, (1000.0, 0.0))
+		controller.returnOutput(1.0, (1000.002, 0.0))
+		I = controller.I
+		#0.0030004 s is not in the full table and must not be rounded to 0.003 s
+		controller.returnOutput(1.0, (1000.0050004, 0.0))
+		self.assertAlmostEqual((controller.I - I)/(2.0/0.2), 0.0030004, places = 10)
+
+class GainScheduledPIDTest(unittest.TestCase):
+
+	def test_first_sample_with_absolute_time(self):
+		pid = PID.PID(1.0, Ti = 0.2, setPointWeightingDict = {'b': 1})
+		controller = PID.GainScheduledPID(pid, [0, 100, 200], [1.0, 2.0, 4.0], Ti = [0.2, 0.2, 0.1])
+		t = time.time()
+		u = controller.returnOutput(150.0, (t, 0.0))
+		self.assertEqual(pid.I, 0)
+		self.assertAlmostEqual(u, 150.0)
+		controller.returnOutput(150.0, (t + 0.002, 0.0))
+		self.assertAlmostEqual(pid.I, 1.0*0.002/0.2*150.0)
+
+	def test_gain_change_keeps_integrator(self):
+		pid = PID.PID(1.0, Ti = 0.2, setPointWeightingDict = {'b': 1})
+		controller = PID.GainScheduledPID(pid, [0, 100, 200], [1.0, 2.0, 4.0], Ti = [0.2, 0.2, 0.1])
+		t = time.time()
+		controller.returnOutput(150.0, (t, 0.0))
+		controller.returnOutput(150.0, (t + 0.002, 0.0))
+		I = pid.I
+		controller.returnOutput(150.0, (t + 0.004, 150.0)) #schedules K = 3
+		self.assertEqual(controller.updates, 1)
+		self.assertAlmostEqual(pid.getParameters()['K'], 3.0)
+		#integrator continues from its previous value with the new gains (K*h/Ti = 3*0.002/0.15)
+		self.assertAlmostEqual(pid.I, I + 3.0*0.002/0.15*150.0)
+
+class PIDArrayTest(unittest.TestCase):
+
+	def test_per_axis_none(self):
+		controller = PID.PIDArray([1.0, 2.0, 0.5], Ti = [0.5, None, 0.5], Td = [None, 0.05, None], uMin = [-1, None, -1], uMax = 1, b = 1)
+		self.assertTrue(numpy.isinf(controller.Ti[1]))
+		self.assertEqual(controller.Td[0], 0)
+		self.assertTrue(numpy.all(numpy.isfinite(controller.Tt[[0, 2]])))
+
+		t = 1000.0
+		for k in xrange(10):
+			u = controller.returnOutput([0.5, 0.5, 0.5], (t, numpy.zeros(3)))
+			t += 0.002
+		self.assertTrue(numpy.all(numpy.isfinite(u)))
+		#axis 1 has no integral term
+		self.assertEqual(controller.I[1], 0)
+		self.assertAlmostEqual(u[1], 1.0)
+
+	def test_matches_scalar_PID(self):
+		K, Ti, Td, Tt, b = [1.0, 2.0, 0.5], [0.5, 0.3, 0.2], [0.02, 0.05, 0.01], [0.1, 0.12, 0.05], [0.0, 0.5, 1.0]
+		uMin, uMax = -1.0, 1.0
+		saturate = lambda v: min(max(v, uMin), uMax)
+		for h in [0.002, None]:
+			controller = PID.PIDArray(K, Ti = Ti, Td = Td, h = h, b = b, Tt = Tt, uMin = uMin, uMax = uMax)
+			pids = [PID.PID(K[i], Ti = Ti[i], Td = Td[i], h = h, antiWindupDict = {'Tt': Tt[i], 'actuatorModel': saturate}, setPointWeightingDict = {'b': b[i]}) for i in xrange(3)]
+			t = 1000.0
+			y = numpy.zeros(3)
+			for k in xrange(200):
+				ysp = numpy.array([0.5, -0.3, 2.0]) if k >= 10 else numpy.zeros(3)
+				u = controller.returnOutput(ysp, (t, y))
+				expected = [pid.returnOutput(ysp[i], (t, y[i])) for i, pid in enumerate(pids)]
+				numpy.testing.assert_allclose(u, expected, rtol = 10**(-9), atol = 10**(-12))
+				#first order plant, so the measurement lags the output
+				y = 0.9*y + 0.1*u
+				t += 0.002 if k % 3 else 0.0025
+
+if __name__ == '__main__':
+	unittest.main()